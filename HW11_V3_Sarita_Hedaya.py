@@ -1,11 +1,248 @@
-from collections import defaultdict
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict, defaultdict
+from collections.abc import Mapping
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from operator import add, itemgetter
+from itertools import count, groupby, islice
 from prettytable import PrettyTable
+import argparse
+import asyncio
+import cProfile
+import csv
+import gc
+import io
+import json
+import mmap
 import os
+import pickle
+import pstats
 import unittest
+import shutil
 import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+try:
+    import resource # not on Windows, where the phases report no peak memory without trace_memory
+except ImportError:
+    resource = None
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Homework11.db') # the database that comes with this file
+
+# The tables of the HW11 database. CWIDs are primary keys and the grades are indexed for the instructor summary
+# and for looking up a student's grades
+SCHEMA = (
+    "create table if not exists HW11_students (CWID TEXT PRIMARY KEY, Name TEXT, Major TEXT)",
+    "create table if not exists HW11_instructors (CWID TEXT PRIMARY KEY, Name TEXT, Dept TEXT)",
+    "create table if not exists HW11_majors (Major TEXT, Course TEXT, Flag TEXT)", # Flag is R for required and E for elective
+    "create table if not exists HW11_grades (Student_CWID TEXT, Course TEXT, Grade TEXT, Instructor_CWID TEXT)",
+    "create index if not exists HW11_grades_instructor_course on HW11_grades (Instructor_CWID, Course)",
+    "create index if not exists HW11_grades_student_course on HW11_grades (Student_CWID, Course)",
+    "create index if not exists HW11_majors_major on HW11_majors (Major, Flag, Course)",
+    # HW11_instructor_courses[instructor, course] = number of grades, kept up to date by the triggers on HW11_grades
+    "create table if not exists HW11_instructor_courses (Instructor_CWID TEXT, Course TEXT, Students INTEGER NOT NULL,"
+    " PRIMARY KEY (Instructor_CWID, Course)) WITHOUT ROWID",
+    """create trigger if not exists HW11_grades_insert after insert on HW11_grades begin
+        insert into HW11_instructor_courses values (new.Instructor_CWID, new.Course, 1)
+            on conflict (Instructor_CWID, Course) do update set Students = Students + 1;
+    end""",
+    """create trigger if not exists HW11_grades_delete after delete on HW11_grades begin
+        update HW11_instructor_courses set Students = Students - 1 where Instructor_CWID = old.Instructor_CWID and Course = old.Course;
+        delete from HW11_instructor_courses where Instructor_CWID = old.Instructor_CWID and Course = old.Course and Students = 0;
+    end""",
+    """create trigger if not exists HW11_grades_update after update of Instructor_CWID, Course on HW11_grades begin
+        update HW11_instructor_courses set Students = Students - 1 where Instructor_CWID = old.Instructor_CWID and Course = old.Course;
+        delete from HW11_instructor_courses where Instructor_CWID = old.Instructor_CWID and Course = old.Course and Students = 0;
+        insert into HW11_instructor_courses values (new.Instructor_CWID, new.Course, 1)
+            on conflict (Instructor_CWID, Course) do update set Students = Students + 1;
+    end""",
+)
+
+# Students per instructor and course, read from the counts the triggers keep, so the cost grows with the number of
+# instructor and course pairs instead of the number of grades
+INSTRUCTOR_SUMMARY = """
+    select I.CWID, I.Name, I.Dept, C.Course, C.Students
+    from HW11_instructor_courses C
+    join HW11_instructors I
+    on I.CWID = C.Instructor_CWID"""
+
+INSTRUCTOR_COURSES = INSTRUCTOR_SUMMARY + """
+    where C.Instructor_CWID = ?""" # the rows of one instructor, found by the primary key of HW11_instructor_courses
+
+# The student summary of SQLUniversity in one pass over HW11_students. A course is completed when the student's last grade
+# in it, the one with the highest rowid like the last line of grades.txt, is a passing grade. The course lists are joined
+# with COURSE_SEPARATOR, Remaining_Electives is null once an elective is completed
+COURSE_SEPARATOR = '\x1f'
+PASSED = """
+    select G.Course from HW11_grades G
+    where G.Student_CWID = S.CWID and G.Grade in ({passing})
+    and G.rowid = (select max(L.rowid) from HW11_grades L where L.Student_CWID = G.Student_CWID and L.Course = G.Course)"""
+PASSED_COURSE = """exists (
+    select 1 from HW11_grades G
+    where G.Student_CWID = S.CWID and G.Course = M.Course and G.Grade in ({passing})
+    and G.rowid = (select max(L.rowid) from HW11_grades L where L.Student_CWID = S.CWID and L.Course = M.Course))""" # an index seek per course
+STUDENT_SUMMARY = f"""
+    select S.CWID, S.Name, S.Major,
+        (select group_concat(Course, char(31)) from ({PASSED})),
+        (select group_concat(M.Course, char(31)) from HW11_majors M where M.Major = S.Major and M.Flag = 'R' and not {PASSED_COURSE}),
+        case when exists (select 1 from HW11_majors M where M.Major = S.Major and M.Flag = 'E' and {PASSED_COURSE}) then null
+            else coalesce((select group_concat(M.Course, char(31)) from HW11_majors M where M.Major = S.Major and M.Flag = 'E'), '') end
+    from HW11_students S
+    order by S.rowid"""
+
+# The last grade of every student in every course, a student without grades has one row with a null course
+STUDENT_GRADES = """
+    select S.CWID, S.Major, G.Course, G.Grade
+    from HW11_students S
+    left join HW11_grades G on G.Student_CWID = S.CWID
+        and G.rowid = (select max(L.rowid) from HW11_grades L where L.Student_CWID = S.CWID and L.Course = G.Course)
+    order by S.rowid"""
+
+# The major summary in the order the majors were first loaded
+MAJOR_SUMMARY = """
+    select Major, group_concat(case when Flag = 'R' then Course end, char(31)), group_concat(case when Flag = 'E' then Course end, char(31))
+    from HW11_majors
+    group by Major
+    order by min(rowid)"""
+
+# Fills HW11_instructor_courses from the grades already in the database, straight from the covering index
+COUNT_INSTRUCTOR_COURSES = """
+    insert into HW11_instructor_courses (Instructor_CWID, Course, Students)
+    select Instructor_CWID, Course, count(*)
+    from HW11_grades
+    group by Instructor_CWID, Course"""
+
+def create_schema(connection):
+    """ create the tables, indexes and triggers in SCHEMA that are missing. A table of students or instructors from an older
+        database without a primary key is rebuilt with CWID as its key, a later row for the same CWID wins.
+        A new HW11_instructor_courses table starts with the counts of the grades already in the database
+    """
+    with connection: # commits, or rolls back if a statement fails
+        connection.execute('begin')
+        counted = connection.execute("select 1 from sqlite_master where name = 'HW11_instructor_courses'").fetchall()
+        for table, columns in (('HW11_students', 'CWID, Name, Major'), ('HW11_instructors', 'CWID, Name, Dept')):
+            info = connection.execute(f'PRAGMA table_info({table})').fetchall() # (cid, name, type, notnull, default, pk)
+            if info and not any(column[1] == 'CWID' and column[5] for column in info):
+                connection.execute(f'alter table {table} rename to {table}_old')
+                connection.execute(next(statement for statement in SCHEMA if f' {table} ' in statement))
+                connection.execute(f'insert or replace into {table} ({columns}) select {columns} from {table}_old')
+                connection.execute(f'drop table {table}_old')
+        majors = connection.execute('PRAGMA table_info(HW11_majors)').fetchall()
+        if majors and not any(column[1] == 'Flag' for column in majors): # older databases didn't keep the flag
+            connection.execute('alter table HW11_majors add column Flag TEXT')
+        connection.execute('drop index if exists HW11_grades_student') # HW11_grades_student_course starts with the same column
+        for statement in SCHEMA:
+            connection.execute(statement)
+        if not counted:
+            connection.execute(COUNT_INSTRUCTOR_COURSES)
+
+
+# Settings for a bulk load: no rollback journal on disk, no fsync, a 256 MB page cache and temporary data in memory.
+# A crash during the load can leave the database unusable, which is fine since load_database rebuilds it from the files
+LOAD_PRAGMAS = ('PRAGMA journal_mode=MEMORY', 'PRAGMA synchronous=OFF', 'PRAGMA cache_size=-262144', 'PRAGMA temp_store=MEMORY')
+
+# (table, file, fields per line, shared columns, insert statement) in the order load_database loads them
+LOAD_FILES = (
+    ('HW11_majors', 'majors.txt', 3, (0, 1, 2), 'insert into HW11_majors (Major, Flag, Course) values (?, ?, ?)'),
+    ('HW11_students', 'students.txt', 3, (2,), 'insert or replace into HW11_students (CWID, Name, Major) values (?, ?, ?)'),
+    ('HW11_instructors', 'instructors.txt', 3, (2,), 'insert or replace into HW11_instructors (CWID, Name, Dept) values (?, ?, ?)'),
+    ('HW11_grades', 'grades.txt', 4, (1, 2, 3), 'insert into HW11_grades (Student_CWID, Course, Grade, Instructor_CWID) values (?, ?, ?, ?)'),
+)
+
+def load_database(dir_path, db_file=DB_FILE, transaction_rows=1000000, build_indexes=True):
+    """ replace the rows of the HW11 tables in db_file with the lines of the .txt files in dir_path and return
+        rows[table] = number of rows loaded. The batches from file_reader_batches go to executemany in transactions
+        of about transaction_rows rows while the indexes and triggers are dropped. They are built again after the load,
+        unless build_indexes is False (then create_schema builds them on the next ConnectionPool connection)
+    """
+    connection = sqlite3.connect(db_file, isolation_level=None)
+    journal_mode = connection.execute('PRAGMA journal_mode').fetchone()[0]
+    for pragma in LOAD_PRAGMAS:
+        connection.execute(pragma)
+    rows = dict()
+    try:
+        create_schema(connection)
+        with connection:
+            connection.execute('begin')
+            # keeping the indexes, the counts and their triggers up to date row by row is much slower than building them once
+            dropped = connection.execute("select type, name from sqlite_master where type in ('index', 'trigger') and sql is not null").fetchall()
+            for kind, name in dropped:
+                connection.execute(f'drop {kind} {name}')
+            connection.execute('drop table HW11_instructor_courses')
+            for table, *_ in LOAD_FILES:
+                connection.execute(f'delete from {table}')
+
+        for table, name, fields_per_line, shared, insert in LOAD_FILES:
+            rows[table] = 0
+            pending = 0 # rows inserted in the current transaction
+            connection.execute('begin')
+            try:
+                for batch in file_reader_batches(os.path.join(dir_path, name), fields_per_line, '\t', shared=shared):
+                    connection.executemany(insert, batch)
+                    rows[table] += len(batch)
+                    pending += len(batch)
+                    if pending >= transaction_rows:
+                        connection.execute('commit')
+                        connection.execute('begin')
+                        pending = 0
+            except ValueError as e:
+                print(e) # like the imports, the lines before the bad one are kept
+            connection.execute('commit')
+
+        if build_indexes:
+            create_schema(connection)
+    finally:
+        connection.execute(f'PRAGMA journal_mode={journal_mode}')
+        connection.close()
+    return rows
+
+
+class ConnectionPool:
+    """ Gives each thread its own connection to the SQLite database, opened the first time the thread needs it.
+    The connections use WAL mode, so readers in many threads don't block each other, and cache their prepared statements.
+    The first connection brings the database up to date with create_schema """
+    def __init__(self, db_file=DB_FILE, cached_statements=256, timeout=5.0):
+        self.db_file = db_file
+        self._schema_ready = False
+        self.cached_statements = cached_statements # number of prepared statements each connection keeps
+        self.timeout = timeout # seconds to wait for a lock held by another connection
+        self._local = threading.local() # self._local.connection = the connection of the current thread
+        self._connections = list() # every connection opened, so that close() can reach them all
+        self._lock = threading.Lock()
+
+    def connection(self):
+        """ return the connection of the current thread, opening it on first use """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # check_same_thread=False only lets close() run from another thread, each connection is used by its own thread
+            connection = sqlite3.connect(self.db_file, timeout=self.timeout, cached_statements=self.cached_statements, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+                if not self._schema_ready:
+                    create_schema(connection)
+                    self._schema_ready = True
+        return connection
+
+    def execute(self, sql, parameters=()):
+        """ run sql on the current thread's connection and return all the rows """
+        return self.connection().execute(sql, parameters).fetchall()
+
+    def close(self):
+        """ close every connection, a thread that uses the pool afterwards opens a new one """
+        with self._lock:
+            connections, self._connections = self._connections, list()
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
 
-DB_FILE = 'G:\My Drive\F18\SSW-810\Week 11\Homework11.db' #path of db file (from data grip, rightclick > properties)
-db = sqlite3.connect(DB_FILE) #load the database into db
 
 def file_reader(file_name, fields_per_line, separator=',', header=False):
     """this generator returns all the values of a line on each call to next()"""
@@ -16,110 +253,1388 @@ def file_reader(file_name, fields_per_line, separator=',', header=False):
     else: # If the file is found
         with fp:
             line_number = 1 # Start line counter to identify line that raises ValueError
-            next_line = [] # Initialize next_line variable to store the line in question
-            
+
             for line in fp:
                 line = line.rstrip('\n\r').split(separator) # Strips the \n and/or \r from the end of the line and Separates the line into values using the separator
                 if len(line) != fields_per_line:
                     raise ValueError(file_name, "has", len(line), "fields in", line_number, "but expected", fields_per_line)
-                for value in line: 
-                    next_line.append(value)
-                
-                line = next_line # Transfer the values into line, so we can empty and reuse next_line
-                next_line = [] # Before yielding, we must empty next_line for future use
                 line_number += 1 # Increase the line counter by 1
-                if header == True: # If there is a header, skip that line. 
+                if header == True: # If there is a header, skip that line.
                     header = False # Set header=False so later lines don't get skipped
                     continue
                 yield tuple(line)
 
-class University:
+BLOCK_SIZE = 1 << 15 # number of bytes read from the file at a time, small enough that a block stays in the CPU cache
+
+def split_batch(lines, fields_per_line, separator, file_name, line_number, shared=(), values=None, errors=None):
+    """ split a block of lines into a list of tuples, return (batch, error) where batch holds the lines
+        before the first bad one and error is the ValueError for that line (or None).
+        With a list errors, every bad line is appended to it as (line number, line, number of fields)
+        and batch holds all the good lines instead.
+        The values in the columns listed in shared are replaced by the copy already stored in values,
+        so every row that repeats a value reuses the same string
+    """
+    rows = [line.split(separator) for line in lines]
+    error = None
+    if set(map(len, rows)) != {fields_per_line}: # only look for the bad line when the batch has one
+        if errors is None:
+            bad = next(i for i, row in enumerate(rows) if len(row) != fields_per_line)
+            error = ValueError(file_name, "has", len(rows[bad]), "fields in", line_number + bad, "but expected", fields_per_line)
+            rows = rows[:bad] # keep the lines before the bad one, like file_reader does
+        else:
+            errors.extend((line_number + i, lines[i], len(row)) for i, row in enumerate(rows) if len(row) != fields_per_line)
+            rows = [row for row in rows if len(row) == fields_per_line]
+    if not shared or not rows:
+        return list(map(tuple, rows)), error
+
+    columns = list(zip(*rows))
+    for i in shared:
+        columns[i] = map(values.setdefault, columns[i], columns[i]) # keep the first copy of each value
+    return list(zip(*columns)), error
+
+def file_reader_batches(file_name, fields_per_line, separator=',', header=False, shared=(), block_size=BLOCK_SIZE, start=0, stop=None, first_line=1,
+                        errors=None, values=None):
+    """ this generator reads the file in large blocks and returns a list of tuples (one per line) on each call to next().
+        start and stop limit the reading to a byte range of the file, they must fall on line boundaries,
+        first_line is the line number of the line at start. A bad line raises ValueError, unless errors is a list,
+        see split_batch, then the reader keeps going. values is the dict of the copies of the shared values,
+        give the same one to several readers to share values between files, by default each reader has its own
+    """
+    try:
+        fp = open(file_name, 'rb')
+    except FileNotFoundError:
+        print("can't open", file_name)
+    else:
+        with fp:
+            fp.seek(start)
+            unread = -1 if stop is None else stop - start # number of bytes left to read, -1 reads to the end of the file
+            line_number = first_line # number of the first line in the next batch
+            leftover = b'' # the unfinished last line of the previous block
+            values = dict() if values is None else values # values[value] = the one copy of a value from the shared columns
+            while True:
+                block = fp.read(block_size if unread < 0 else min(block_size, unread))
+                unread -= len(block) if unread >= 0 else 0
+                if block:
+                    data = leftover + block
+                    cut = data.rfind(b'\n') # the block may end in the middle of a line, keep that part for the next block
+                    if cut == -1:
+                        leftover = data
+                        continue
+                    text, leftover = data[:cut].decode('utf-8'), data[cut + 1:]
+                elif leftover:
+                    text, leftover = leftover.decode('utf-8'), b'' # the last line of the file has no \n
+                else:
+                    break
+
+                lines = text.split('\n')
+                if '\r' in text:
+                    lines = [line.rstrip('\r') for line in lines]
+                batch, error = split_batch(lines, fields_per_line, separator, file_name, line_number, shared, values, errors)
+                line_number += len(lines)
+                if header == True and batch: # If there is a header, skip that line
+                    header = False
+                    batch = batch[1:]
+                if batch:
+                    yield batch
+                if error is not None:
+                    raise error
+
+def mmap_file_reader(file_name, fields_per_line, separator=',', header=False, shared=(), block_size=BLOCK_SIZE, start=0, stop=None, first_line=1,
+                     errors=None, values=None):
+    """ this generator scans the file in place through a memory map and returns a list of tuples (one per line)
+        on each call to next(). Only one block of lines is turned into strings at a time.
+        start and stop limit the scan to a byte range of the file, they must fall on line boundaries,
+        first_line is the line number of the line at start. errors keeps the reader going past bad lines, see split_batch,
+        values holds the copies of the shared values as in file_reader_batches
+    """
+    try:
+        fp = open(file_name, 'rb')
+    except FileNotFoundError:
+        print("can't open", file_name)
+    else:
+        with fp:
+            size = os.fstat(fp.fileno()).st_size
+            if size == 0: # an empty file can't be mapped, and has no lines anyway
+                return
+            if stop is not None:
+                size = min(size, stop)
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                line_number = first_line
+                values = dict() if values is None else values
+                released = start // mmap.PAGESIZE * mmap.PAGESIZE # offset up to which the mapped pages were given back
+                # start is the offset of the first byte of the next block
+                while start < size:
+                    end = mm.find(b'\n', min(start + block_size, size - 1), size) # blocks always end on a line boundary
+                    if end == -1:
+                        end = size # the last line of the file has no \n
+                    with memoryview(mm)[start:end] as view:
+                        text = str(view, 'utf-8') # decode straight from the mapped pages, without an intermediate bytes copy
+                    start = end + 1
+                    if hasattr(mmap, 'MADV_DONTNEED') and start - released >= block_size:
+                        length = (start - released) // mmap.PAGESIZE * mmap.PAGESIZE
+                        mm.madvise(mmap.MADV_DONTNEED, released, length) # the pages already scanned don't need to stay resident
+                        released += length
+
+                    lines = text.split('\n')
+                    if '\r' in text:
+                        lines = [line.rstrip('\r') for line in lines]
+                    batch, error = split_batch(lines, fields_per_line, separator, file_name, line_number, shared, values, errors)
+                    line_number += len(lines)
+                    if header == True and batch:
+                        header = False
+                        batch = batch[1:]
+                    if batch:
+                        yield batch
+                    if error is not None:
+                        raise error
+
+def line_chunks(file_name, chunks, size=None):
+    """ split the first size bytes of the file (all of it by default) into at most chunks byte ranges that start and end
+        on line boundaries, return a list of (start, stop)
+    """
+    if size is None:
+        size = os.path.getsize(file_name)
+    bounds = [0]
+    with open(file_name, 'rb') as fp:
+        for i in range(1, chunks):
+            position = size * i // chunks
+            if position <= bounds[-1]:
+                continue
+            fp.seek(position - 1)
+            fp.readline() # move to the start of the line after position - 1
+            if fp.tell() >= size:
+                break
+            bounds.append(fp.tell())
+    bounds.append(size)
+    return [(start, stop) for start, stop in zip(bounds, bounds[1:]) if start < stop]
+
+def import_grades_chunk(file_name, start, stop, separator='\t', course_index=True):
+    """ parse the lines of the grades file between start and stop in a worker process and return
+        (values, courses, counts, taught, rows, error). The courses, grades and instructor and student CWIDs in the
+        results are ids, indexes into the list values, so the parent looks up each distinct value once:
+        courses[student_cwid] = {course id: grade id}, counts[instructor_cwid] = defaultdict(int) of students per course id,
+        taught[course id][instructor id] = {student id: None}, empty without course_index, rows is the number of lines parsed
+        and error holds the args of the ValueError for a bad line, with the line number counted from start
+    """
+    ids = defaultdict()
+    ids.default_factory = ids.__len__ # a new value gets the next id
+    value_id = ids.__getitem__
+    courses = dict()
+    counts = dict()
+    taught = defaultdict(partial(defaultdict, dict))
+    rows = 0
+    error = None
+    try:
+        for batch in mmap_file_reader(file_name, 4, separator, shared=SHARED_COLUMNS['grades.txt'], start=start, stop=stop):
+            for student_cwid, course, grade, instructor_cwid in batch:
+                student_courses = courses.get(student_cwid)
+                if student_courses is None:
+                    student_courses = courses[student_cwid] = dict()
+                course = value_id(course)
+                student_courses[course] = value_id(grade) # a later row for the same course replaces the grade, like Student.add_course
+                instructor_counts = counts.get(instructor_cwid)
+                if instructor_counts is None:
+                    instructor_counts = counts[instructor_cwid] = defaultdict(int)
+                instructor_counts[course] += 1
+            if course_index:
+                for student_cwid, course, grade, instructor_cwid in batch:
+                    taught[value_id(course)][value_id(instructor_cwid)][value_id(student_cwid)] = None
+            rows += len(batch)
+    except ValueError as e:
+        error = e.args
+    return list(ids), courses, counts, taught, rows, error
+
+def unique(lists):
+    """ generate the values in lists in order, skipping the ones seen before """
+    seen = set()
+    for values in lists:
+        for value in values:
+            if value not in seen:
+                seen.add(value)
+                yield value
+
+@contextmanager
+def gc_paused():
+    """ turn the cyclic garbage collector off while building lots of acyclic containers, it would only rescan them over and over """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+NO_PHASE = nullcontext() # what University.timed returns without instruments, costs next to nothing
+
+class Instrumentation:
+    """ Collects the wall and CPU time, the rows and the peak memory of each named phase of a program.
+    Phases can nest and repeat, a repeated phase adds up. The peak memory is how much the process' peak RSS grew
+    during the phase, or with trace_memory=True the peak of the memory traced by tracemalloc above the start of the
+    phase, which is exact but slows Python down. profile=True runs cProfile while any phase runs """
+    def __init__(self, profile=False, trace_memory=False):
+        self.phases = dict() # self.phases[name] = {'calls', 'wall', 'cpu', 'rows', 'peak_bytes'}
+        self.profiler = cProfile.Profile() if profile else None
+        self.trace_memory = trace_memory
+        self._stack = [] # [start, peak] of the traced memory of each running phase, innermost last
+        self._tracing = trace_memory and not tracemalloc.is_tracing() # True if this object starts tracemalloc, close stops it
+        if self._tracing:
+            tracemalloc.start()
+
+    def close(self):
+        """ stop tracemalloc if this object started it, the phases timed so far stay in the report """
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+            self.trace_memory = False
+
+    def _phase(self, name):
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'rows': 0, 'peak_bytes': 0}
+        return phase
+
+    @contextmanager
+    def phase(self, name):
+        """ time the code in the with block as phase name """
+        if self.profiler is not None and not self._stack:
+            self.profiler.enable()
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            for outer in self._stack: # the peak is reset for this phase, the running phases keep what they saw so far
+                outer[1] = max(outer[1], peak)
+            tracemalloc.reset_peak()
+            self._stack.append([current, current])
+        else:
+            self._stack.append(None)
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource is not None else 0
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            phase = self._phase(name)
+            phase['calls'] += 1
+            phase['wall'] += wall
+            phase['cpu'] += cpu
+            frame = self._stack.pop()
+            if self.trace_memory:
+                frame[1] = max(frame[1], tracemalloc.get_traced_memory()[1])
+                for outer in self._stack:
+                    outer[1] = max(outer[1], frame[1])
+                peak = frame[1] - frame[0]
+            elif resource is not None:
+                peak = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss) * 1024 # ru_maxrss is in KB on Linux
+            else:
+                peak = 0
+            phase['peak_bytes'] = max(phase['peak_bytes'], peak)
+            if self.profiler is not None and not self._stack:
+                self.profiler.disable()
+
+    def count(self, name, rows):
+        """ add rows to the rows of phase name """
+        self._phase(name)['rows'] += rows
+
+    def report(self, functions=20):
+        """ return the phases and, with profile=True, the functions with the most cumulative time as a dict """
+        report = {'phases': {name: dict(phase) for name, phase in self.phases.items()}, 'profile': None}
+        if self.profiler is not None:
+            stats = pstats.Stats(self.profiler).stats # stats[(file, line, function)] = (primitive calls, calls, tottime, cumtime, callers)
+            rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:functions]
+            report['profile'] = [{'function': f"{file}:{line}({function})", 'calls': calls, 'tottime': tottime, 'cumtime': cumtime}
+                                 for (file, line, function), (primitive, calls, tottime, cumtime, callers) in rows]
+        return report
+
+    def summary(self, functions=20):
+        """ return the report as text for printing """
+        table = PrettyTable()
+        table.field_names = ['Phase', 'Calls', 'Wall s', 'CPU s', 'Rows', 'Rows/s', 'Peak MB']
+        for name, phase in self.phases.items():
+            rate = f"{phase['rows'] / phase['wall']:.0f}" if phase['rows'] and phase['wall'] else ''
+            table.add_row([name, phase['calls'], f"{phase['wall']:.3f}", f"{phase['cpu']:.3f}", phase['rows'] or '', rate, f"{phase['peak_bytes'] / (1 << 20):.1f}"])
+        text = table.get_string()
+        if self.profiler is not None:
+            stream = io.StringIO()
+            pstats.Stats(self.profiler, stream=stream).sort_stats('cumulative').print_stats(functions)
+            text += '\n' + stream.getvalue()
+        return text
+
+
+QUARANTINE_FILE = 'quarantine.txt' # a name for University(quarantine=...), next to the data files
+
+class Quarantine:
+    """ Writes the lines that fail validation to file_name, one per line: the data file, the line number, the reason
+    and the line itself, tab separated, so the line is everything after the third tab. counts[data file, reason]
+    counts them. The file is only created for the first bad line """
+    __slots__ = ('file_name', 'counts', '_fp')
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.counts = Counter()
+        self._fp = None
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def add(self, data_file, line_number, reason, line, detail=''):
+        """ quarantine line number line_number of data_file for reason, detail is written after the reason """
+        if self._fp is None:
+            self._fp = open(self.file_name, 'a', encoding='utf-8')
+        data_file = os.path.basename(data_file)
+        self._fp.write(f"{data_file}\t{line_number}\t{reason}{': ' + detail if detail else ''}\t{line}\n")
+        self.counts[data_file, reason] += 1
+
+    def flush(self):
+        """ close the file so other programs see every line written so far, the next line opens it again """
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def clear(self):
+        """ start over with an empty file and no counts """
+        self.flush()
+        if os.path.exists(self.file_name):
+            open(self.file_name, 'w').close()
+        self.counts.clear()
+
+    def summary(self, counts=None):
+        """ return counts, self.counts by default, as text with one line per data file and reason """
+        counts = self.counts if counts is None else counts
+        return '\n'.join(f"{lines} lines of {data_file} quarantined in {self.file_name}: {reason}"
+                         for (data_file, reason), lines in sorted(counts.items()))
+
+
+# SHARED_COLUMNS[file] = the columns whose values the readers look up in the University's Symbols, all but the names.
+# Every grade repeats a student and an instructor CWID, sharing them saves more than the courses and grades do
+SHARED_COLUMNS = {'majors.txt': (0, 1, 2), 'students.txt': (0, 2), 'instructors.txt': (0, 2), 'grades.txt': (0, 1, 2, 3)}
+DATA_FILES = ('majors.txt', 'students.txt', 'instructors.txt', 'grades.txt') # in the order University imports them
+CHECK_BYTES = 4096 # number of bytes at each end of the imported part of a file that fingerprint checks
+
+def fingerprint(file_name, offset):
+    """ return a checksum of the first and last CHECK_BYTES bytes before offset in the file, so that a file that
+        was rewritten instead of appended to can be told apart without reading all of it again
+    """
+    if offset == 0:
+        return 0
+    with open(file_name, 'rb') as fp:
+        head = fp.read(min(offset, CHECK_BYTES))
+        fp.seek(max(0, offset - CHECK_BYTES))
+        tail = fp.read(offset - fp.tell())
+    return zlib.crc32(tail, zlib.crc32(head))
+
+def complete_lines_end(file_name, start, stop):
+    """ return the offset just past the last newline between start and stop, or start if there is no complete line """
+    with open(file_name, 'rb') as fp:
+        position = stop
+        while position > start:
+            size = min(BLOCK_SIZE, position - start)
+            fp.seek(position - size)
+            cut = fp.read(size).rfind(b'\n')
+            if cut != -1:
+                return position - size + cut + 1
+            position -= size
+    return start
+
+def line_offset(file_name, start, lines):
+    """ return the offset of the line that starts lines lines after the one at start """
+    with open(file_name, 'rb') as fp:
+        fp.seek(start)
+        position = start
+        while lines:
+            block = fp.read(BLOCK_SIZE)
+            if not block:
+                break
+            cut = -1
+            while lines and (cut := block.find(b'\n', cut + 1)) != -1:
+                lines -= 1
+            position += len(block) if lines else cut + 1
+    return position
+
+SNAPSHOT_FILE = 'university.snapshot' # written next to the data files by University(snapshot=True)
+SNAPSHOT_VERSION = 5 # change when the layout of the snapshot changes
+
+LAZY_COLLECTIONS = {'_majors': 'import_majors', 'students': 'import_students', 'instructors': 'import_instructors'} # attribute: method that imports it
+
+def grade_shard(cwid, shards):
+    """ return the shard of the student with cwid, the same in every process unlike hash() """
+    return zlib.crc32(cwid.encode()) % shards
+
+def snapshot_key(dir_path, compact, course_index=False, quarantine=False):
+    """ return what a snapshot of the files in dir_path must match to be used: the layout version, the storage mode,
+        whether it has the course index, whether bad lines were quarantined instead of stopping the import
+        and the modification time and size of each data file
+    """
+    key = [SNAPSHOT_VERSION, compact, course_index, quarantine]
+    for name in DATA_FILES:
+        try:
+            stat = os.stat(os.path.join(dir_path, name))
+        except FileNotFoundError:
+            key.append(None)
+        else:
+            key.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(key)
+
+EXPORT_BATCH = 65536 # number of rows per column batch written by export_summary
+EXPORT_FORMATS = {'csv': '.csv', 'arrow': '.arrow', 'parquet': '.parquet'} # file extension of each export format
+
+# EXPORT_COLUMNS[summary] = (name, type) of each column, the types are str, int or list (a list of strings, None if missing)
+EXPORT_COLUMNS = {
+    'students': (('CWID', str), ('Name', str), ('Major', str), ('Completed Courses', list), ('Remaining Required', list), ('Remaining Electives', list)),
+    'instructors': (('CWID', str), ('Name', str), ('Department', str), ('Course', str), ('#Students', int)),
+    'majors': (('Major', str), ('Required Courses', list), ('Elective Courses', list)),
+}
+
+def column_batches(rows, batch_size=EXPORT_BATCH):
+    """ generate the rows in batches of batch_size rows, each batch a list of columns """
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield [list(column) for column in zip(*batch)]
+
+def write_columns(file_name, columns, batches, file_format='csv'):
+    """ write the column batches to file_name, columns is the (name, type) of each column as in EXPORT_COLUMNS.
+        csv keeps list columns as JSON arrays, arrow (Arrow IPC file) and parquet need pyarrow and keep them as list<string>
+    """
+    if file_format == 'csv':
+        with open(file_name, 'w', newline='') as fp:
+            writer = csv.writer(fp)
+            writer.writerow([name for name, kind in columns])
+            lists = [number for number, (name, kind) in enumerate(columns) if kind is list]
+            for batch in batches:
+                for number in lists:
+                    batch[number] = ['' if values is None else json.dumps(values) for values in batch[number]]
+                writer.writerows(zip(*batch))
+        return
+
+    import pyarrow # only needed for these formats
+    types = {str: pyarrow.string(), int: pyarrow.int64(), list: pyarrow.list_(pyarrow.string())}
+    schema = pyarrow.schema([(name, types[kind]) for name, kind in columns])
+    if file_format == 'arrow':
+        writer = pyarrow.ipc.new_file(file_name, schema)
+    elif file_format == 'parquet':
+        import pyarrow.parquet
+        writer = pyarrow.parquet.ParquetWriter(file_name, schema)
+    else:
+        raise ValueError(f"Unknown export format {file_format}")
+    with writer:
+        for batch in batches:
+            writer.write_batch(pyarrow.record_batch(batch, schema=schema))
+
+
+class Summaries(ABC):
+    """ The reports of a university: the student, instructor and major summaries as rows, prettytables and column
+    exports. University builds the rows from the imported files, SQLUniversity from the database. A subclass
+    generates the rows with student_rows and major_rows and sets self.pool and self.instruments """
+    def timed(self, name):
+        """ return a context manager that times phase name in self.instruments, or does nothing without instruments """
+        if self.instruments is None:
+            return NO_PHASE
+        return self.instruments.phase(name)
+
+    @abstractmethod
+    def student_rows(self):
+        """ generate cwid, name, major, completed_courses, remaining_required, remaining_electives for every student """
+
+    @abstractmethod
+    def major_rows(self):
+        """ generate major, required courses, elective courses for every major """
+
+    def instructor_rows(self):
+        """ generate the rows of the instructor summary from INSTRUCTOR_SUMMARY in the database, a page at a time """
+        return paged(self.pool.connection().execute(INSTRUCTOR_SUMMARY))
+
+    def iter_remaining(self):
+        """ generate cwid, (completed_courses, remaining_required, remaining_electives) for every student """
+        for cwid, name, major_name, *remaining in self.student_rows():
+            yield cwid, tuple(remaining)
+
+    def remaining_all(self):
+        """ compute completed_courses, remaining_required, remaining_electives for every student in one pass and return
+            remaining[cwid] = (completed_courses, remaining_required, remaining_electives), see iter_remaining
+        """
+        with gc_paused():
+            return dict(self.iter_remaining())
+
+    # Print summary information as tables
+    def student_prettytable(self):
+        """ create a student pretty table with info the student and courses """
+        student_prettytable = PrettyTable() # initialize pt
+        student_prettytable.field_names = Student.pt_header(self) #set headers as defined in function inside Student class
+        with gc_paused():
+            with self.timed('student remaining'):
+                rows = list(self.student_rows()) # the table keeps every row anyway
+            with self.timed('student_prettytable'):
+                for row in rows:
+                    student_prettytable.add_row(row)
+        if self.instruments is not None:
+            self.instruments.count('student remaining', len(rows))
+        return student_prettytable
+
+    def write_student_summary(self, fp=None):
+        """ write the student summary to fp (default stdout) as the same text as print(self.student_prettytable()),
+            one row at a time. The rows are generated twice, once to find the column widths and once to write them,
+            so the memory used doesn't grow with the number of students
+        """
+        fp = sys.stdout if fp is None else fp
+        field_names = Student.pt_header(self)
+        lines = 0
+        with self.timed('write_student_summary'):
+            widths = column_widths(field_names, self.student_rows())
+            for line in table_lines(field_names, self.student_rows(), widths):
+                fp.write(line)
+                fp.write('\n')
+                lines += 1
+        if self.instruments is not None:
+            self.instruments.count('write_student_summary', lines - 4) # the rules and the header aren't students
+
+    def export_rows(self, summary):
+        """ generate the rows of summary ('students', 'instructors' or 'majors') with the columns of EXPORT_COLUMNS[summary],
+            sets become sorted lists
+        """
+        if summary == 'students':
+            for cwid, name, major_name, completed_courses, remaining_required, remaining_electives in self.student_rows():
+                yield [cwid, name, major_name, sorted(completed_courses), sorted(remaining_required),
+                       None if remaining_electives is None else sorted(remaining_electives)]
+        elif summary == 'instructors':
+            yield from self.instructor_rows()
+        elif summary == 'majors':
+            for major_name, required, electives in self.major_rows():
+                yield [major_name, sorted(required), sorted(electives)]
+        else:
+            raise ValueError(f"Unknown summary {summary}")
+
+    def export_summary(self, out_dir, file_format='csv', batch_size=EXPORT_BATCH):
+        """ write the student, instructor and major summaries to students, instructors and majors files in out_dir
+            in file_format (see EXPORT_FORMATS) and return the names of the files
+        """
+        file_names = []
+        with gc_paused():
+            for summary, columns in EXPORT_COLUMNS.items():
+                file_name = os.path.join(out_dir, summary + EXPORT_FORMATS[file_format])
+                with self.timed('export ' + summary):
+                    write_columns(file_name, columns, column_batches(self.export_rows(summary), batch_size), file_format)
+                file_names.append(file_name)
+        return file_names
+
+    def instructor_prettytable(self):
+        """ create an instructor pretty table with info the instructor and courses """
+        instructor_prettytable = PrettyTable()
+        instructor_prettytable.field_names = Instructor.pt_header(self)
+        with self.timed('instructor sql'):
+            rows = list(self.instructor_rows())
+        with self.timed('instructor_prettytable'):
+            for row in rows: #for each list in the set of lists returned by pt_row (each list is a row)
+                instructor_prettytable.add_row(row) #add it to the pt
+        if self.instruments is not None:
+            self.instruments.count('instructor sql', len(rows))
+        return instructor_prettytable
+
+    def major_prettytable(self):
+        """ create a pretty table containing information of courses associated with majors """
+        major_prettytable = PrettyTable() # initialize pt
+        major_prettytable.field_names = Major.pt_header(self) #set headers as defined in function inside Student class
+        with self.timed('major_prettytable'):
+            for row in self.major_rows():
+                major_prettytable.add_row(row) # add rows using the output of pt_row defined in Student class
+        return major_prettytable
+
+
+class University(Summaries):
     """ Class University imports data from .txt files, organizes such data into 
     dictionaries with classes, and prints them in prettytable format """
-    def __init__(self, dir_path):
+    def __init__(self, dir_path, reader=file_reader_batches, workers=None, compact=False, snapshot=False, pool=None, cache_size=None, instruments=None,
+                 lazy=False, shards=16, quarantine=None, course_index=False):
         self.dir_path = dir_path
+        self.instruments = instruments # an Instrumentation that times the phases of loading and reporting, None to not time them
+        # quarantine=file name keeps importing past bad lines and writes them to that file, see Quarantine.
+        # Without it the import of a file stops at its first line with the wrong number of fields
+        self.quarantine = None if quarantine is None else Quarantine(quarantine)
+        self.pool = ConnectionPool() if pool is None else pool # the database with the instructor summary, opened on the first query
+        self.reader = reader # file_reader_batches or mmap_file_reader, both return lists of rows
+        self.workers = workers # number of processes that parse grades.txt, None or 1 imports the grades in this process
+        # compact=True keeps the grades in Enrollments columns and makes the students CompactStudent views over them.
+        # The grades are then always imported in this process, the worker results don't say which instructor taught a course
+        self.compact = compact
+        self.snapshot = snapshot # True loads from SNAPSHOT_FILE in dir_path while the data files are unchanged, and writes it after parsing them
+        self.remaining_cache = RemainingCache(cache_size) # Student.remaining results of every major, cache_size=None keeps them all
+        # lazy=True imports the majors, students and instructors on their first access and the grades when a method needs them,
+        # see load_grades. student(cwid) imports only the grades of the student's shard, one of shards
+        self.lazy = lazy
+        self.shards = shards
+        # course_index=True keeps the students of each course and instructor for course_students and taught_students as the grades
+        # are imported. It costs a dict insert per grade, so without it course_students scans the students and taught_students can't answer
+        self.course_index = course_index
+        self.load(dir_path)
+
+    def load(self, dir_path):
+        """ import everything from the files in dir_path, dropping what was imported before """
+        self.symbols = Symbols() # one copy of every course, grade, major, department and CWID, shared by all the files
+        self._enrollments = Enrollments(self.symbols) if self.compact else None
         self.students = dict()  # self.students[cwid] = instance of class Student
         self.instructors = dict()  # self.instructors[cwid] = instance of class Instructor
         self._majors = dict() # self.majors[major] = instance of class major
+        self._files = dict() # self._files[file_name] = (offset, lines, checksum) of the part of the file imported so far
+        self.remaining_cache.clear()
+        # indexes kept up to date by add_students and add_grades for the lookups in course_students, major_students and taught_students
+        self._major_students = defaultdict(dict) # self._major_students[major] = {student_cwid: None} for the students in the major
+        # self._taught[course][instructor_cwid] = {student_cwid: None} in the order of their first grades, None without course_index
+        self._taught = defaultdict(partial(defaultdict, dict)) if self.course_index else None
+        self._grade_shards = set() # the shards whose grades the students have while not all the grades were imported
+        self._grades_loaded = True
+
+        if self.snapshot:
+            key = snapshot_key(dir_path, self.compact, self.course_index, self.quarantine is not None) # taken before parsing, a file that changes meanwhile makes the snapshot stale
+            with self.timed('load_snapshot'):
+                if self.load_snapshot(os.path.join(dir_path, SNAPSHOT_FILE), key):
+                    return
+
+        if self.quarantine is not None: # the files are parsed again, a snapshot keeps the lines quarantined when it was taken
+            self.quarantine.clear()
+
+        if self.lazy: # __getattr__ imports the collections, load_grades the grades
+            for name in LAZY_COLLECTIONS:
+                del self.__dict__[name]
+            self._grades_loaded = False
+            return
 
         # Calls functions that import university data from files
-        self.import_majors(dir_path)
-        self.import_students(dir_path)
-        self.import_instructors(dir_path)
-        self.import_grades(dir_path)
+        with gc_paused():
+            for name, import_file in (('import_majors', self.import_majors), ('import_students', self.import_students),
+                                      ('import_instructors', self.import_instructors), ('import_grades', self.import_grades)):
+                with self.timed(name):
+                    import_file(dir_path)
+        self.report_quarantine()
+
+        if self.snapshot:
+            with self.timed('save_snapshot'):
+                self.save_snapshot(os.path.join(dir_path, SNAPSHOT_FILE), key)
+
+    def __getattr__(self, name):
+        """ import the majors, students or instructors on their first access in lazy mode """
+        import_name = LAZY_COLLECTIONS.get(name)
+        if import_name is None or not self.__dict__.get('lazy'):
+            raise AttributeError(f"'University' object has no attribute '{name}'")
+        collection = self.__dict__[name] = dict()
+        with gc_paused(), self.timed(import_name):
+            getattr(self, import_name)(self.dir_path)
+        return collection
+
+    def load_grades(self, cwid=None):
+        """ in lazy mode import the grades that weren't imported yet, all of them or with cwid the shard of that student.
+            A shard only gives its students their courses, the instructors and indexes wait for all the grades
+        """
+        if self._grades_loaded:
+            return
+        if cwid is not None:
+            shard = grade_shard(cwid, self.shards)
+            if shard not in self._grade_shards:
+                with gc_paused(), self.timed('import_grade_shard'):
+                    self.import_grade_shard(self.dir_path, shard)
+                self._grade_shards.add(shard)
+            return
+
+        if self._grade_shards: # start the students of the shards over, the import gives them the same courses again
+            self.remaining_cache.clear()
+            if self._enrollments is not None:
+                self._enrollments = Enrollments(self.symbols)
+            for student in self.students.values():
+                if self._enrollments is None:
+                    student.courses = dict()
+                else:
+                    student._enrollments, student._id, student._last = self._enrollments, self._enrollments.add_student(student.cwid), -1
+            self._grade_shards = set()
+        with gc_paused(), self.timed('import_grades'):
+            self.import_grades(self.dir_path)
+        self._grades_loaded = True
+
+    def data_files(self):
+        """ return the paths of the data files of the university, whether they exist or not """
+        return [os.path.join(self.dir_path, name) for name in DATA_FILES]
+
+    def import_grade_shard(self, dir_path, shard):
+        """ give the students of shard their courses from the grades file in dir_path, in one pass that keeps only their rows """
+        grades_file = os.path.join(dir_path, "grades.txt")
+        students, shards = self.students, self.shards
+        last_cwid, in_shard = None, False # a student's grades are usually next to each other, the shard is worked out once for them
+        # the bad lines are left out like the full import does, it is the one that quarantines them
+        options = dict(values=self.symbols.copies) if self.quarantine is None else dict(values=self.symbols.copies, errors=list())
+        try:
+            for batch in self.reader(grades_file, 4, '\t', shared=SHARED_COLUMNS['grades.txt'], **options): # not self.read_file, the file still has to be imported in full
+                bad = self.check_grades(batch)
+                if bad and self.quarantine is None:
+                    batch = batch[:bad[0][0]] # the full import stops at the first bad row
+                elif bad:
+                    dropped = {index for index, reason, detail in bad}
+                    batch = [row for index, row in enumerate(batch) if index not in dropped]
+                for student_cwid, course, grade, instructor_cwid in batch:
+                    if student_cwid != last_cwid:
+                        last_cwid, in_shard = student_cwid, grade_shard(student_cwid, shards) == shard
+                    if in_shard:
+                        if self._enrollments is None:
+                            students[student_cwid].add_course(course, grade)
+                        else:
+                            students[student_cwid].add_course(course, grade, instructor_cwid)
+                if bad and self.quarantine is None:
+                    break
+        except ValueError as e:
+            print(e)
+
+    def student(self, cwid):
+        """ return the student with cwid, with its courses even in lazy mode, or None if there is no such student """
+        student = self.students.get(cwid)
+        if student is not None:
+            self.load_grades(cwid)
+        return student
+
+    def state(self):
+        """ return the imported majors, students, instructors, indexes and quarantine counts as plain tuples that pickle quickly """
+        majors = [(major._department, major._required, major._electives, None if major.passing_grades is PASSING_GRADES else major.passing_grades)
+                  for major in self._majors.values()]
+        if self._enrollments is None:
+            students = [(student.cwid, student.name, student.major_name, student.courses) for student in self.students.values()]
+        else:
+            students = [(student.cwid, student.name, student.major_name, (student._id, student._last)) for student in self.students.values()]
+        instructors = [(instructor.cwid, instructor.name, instructor.department, dict(instructor.courses)) for instructor in self.instructors.values()]
+        files = {os.path.basename(name): state for name, state in self._files.items()} # the directory may be given by another path next time
+        indexes = (self._major_students, self._taught)
+        quarantined = dict() if self.quarantine is None else dict(self.quarantine.counts)
+        return majors, students, instructors, self._enrollments, files, indexes, self.symbols, quarantined
+
+    def restore_state(self, state, dir_path):
+        """ replace everything imported with state from University.state, taken of the files in dir_path """
+        majors, students, instructors, self._enrollments, files, indexes, self.symbols, quarantined = state
+        self._majors, self.students, self.instructors = dict(), dict(), dict()
+        self._major_students, self._taught = indexes
+        self._files = {os.path.join(dir_path, name): state for name, state in files.items()}
+        self._grades_loaded = True
+        if self.quarantine is not None: # the quarantine file has the lines already, only the counts are restored
+            self.quarantine.counts = Counter(quarantined)
+        with gc_paused():
+            for department, required, electives, passing in majors:
+                major = self._majors[department] = Major(department, passing, self.remaining_cache, self.symbols)
+                major._required, major._electives = required, electives
+            for cwid, name, major_name, courses in students:
+                if self._enrollments is None:
+                    student = self.students[cwid] = Student(cwid, name, major_name, self._majors[major_name])
+                    student.courses = courses
+                else:
+                    number, last = courses
+                    self.students[cwid] = CompactStudent(cwid, name, major_name, self._majors[major_name], self._enrollments, number, last)
+            for cwid, name, department, courses in instructors:
+                instructor = self.instructors[cwid] = Instructor(cwid, name, department)
+                instructor.add_counts(courses)
+
+    def save_snapshot(self, file_name, key):
+        """ write the imported majors, students and instructors to file_name as plain tuples, tagged with key """
+        data = (key,) + self.state()
+        try:
+            with open(file_name + '.tmp', 'wb') as fp:
+                pickle.dump(data, fp, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(file_name + '.tmp', file_name) # readers never see half a snapshot
+        except OSError as e:
+            print("can't write snapshot", file_name, e) # the data was imported, only the next start will be slower
+
+    def load_snapshot(self, file_name, key):
+        """ load the majors, students and instructors from the snapshot in file_name if it was written with key, return True if it was """
+        try:
+            with open(file_name, 'rb') as fp, gc_paused():
+                data = pickle.load(fp)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return False
+        if not isinstance(data, tuple) or data[0] != key:
+            return False
+        self.restore_state(data[1:], os.path.dirname(file_name))
+        return True
+
+    def read_file(self, file_name, fields_per_line, shared=(), appended=False, check=None):
+        """ this generator reads the part of file_name that wasn't imported yet with self.reader and returns a batch of rows
+            on each call to next(), then remembers how far the file was imported. With appended=True only complete
+            lines are read, the program writing the file may be in the middle of a line.
+            check(rows) returns (index, reason, detail) for the rows that can't be imported. Without a quarantine the
+            first of them raises ValueError like a line with the wrong number of fields does. With a quarantine both kinds
+            of bad lines go to the quarantine instead of the batches, and the rest of the file is still read
+        """
+        offset, lines, checksum = self._files.get(file_name, (0, 0, 0))
+        first = lines
+        stopped = False # True after a bad line without a quarantine
+        stop = os.path.getsize(file_name) if os.path.exists(file_name) else None
+        if appended and stop is not None:
+            stop = complete_lines_end(file_name, offset, stop)
+        errors = None if self.quarantine is None else list() # the bad lines the reader skipped since the last batch
+        options = dict(values=self.symbols.copies) if errors is None else dict(values=self.symbols.copies, errors=errors)
+        batches = self.reader(file_name, fields_per_line, '\t', shared=shared, start=offset, stop=stop, first_line=lines + 1, **options)
+        phase = 'read ' + os.path.basename(file_name)
+        try:
+            while True:
+                with self.timed(phase): # only the reading, the caller's work on the batch is timed by its own phase
+                    try:
+                        batch = next(batches, None)
+                    except ValueError:
+                        stopped = True
+                        raise
+                if errors is not None:
+                    batch, read = self.screen(file_name, lines + 1, batch or [], errors, check)
+                    lines += read - len(batch)
+                elif batch and check is not None:
+                    bad = check(batch)
+                    if bad:
+                        index, reason, detail = bad[0]
+                        stopped = True
+                        if index:
+                            lines += index
+                            yield batch[:index]
+                        raise ValueError(file_name, "has", reason, detail, "in", lines + 1)
+                if not batch:
+                    if errors is not None and read:
+                        continue # every line since the last batch was bad
+                    break
+                lines += len(batch)
+                if self.instruments is not None:
+                    self.instruments.count(phase, len(batch))
+                yield batch
+        finally:
+            if stopped: # the import stops at a bad line, the next refresh starts at it again like a reload would
+                stop = line_offset(file_name, offset, lines - first)
+            if stop is not None:
+                self._files[file_name] = (stop, lines, fingerprint(file_name, stop))
+
+    def screen(self, file_name, first_line, rows, errors, check=None):
+        """ quarantine the bad lines in errors, from the reader, and the rows that check finds wrong, then empty errors.
+            rows and errors together are the lines from first_line on. Return (good rows, number of lines)
+        """
+        read = len(rows) + len(errors)
+        for line_number, line, fields in errors:
+            self.quarantine.add(file_name, line_number, 'wrong number of fields', line, str(fields))
+        bad = check(rows) if check is not None and rows else ()
+        if bad: # rare, so the line numbers of the rows are only worked out here
+            skipped = {line_number for line_number, line, fields in errors}
+            line_numbers = list(islice((number for number in count(first_line) if number not in skipped), len(rows)))
+            for index, reason, detail in bad:
+                self.quarantine.add(file_name, line_numbers[index], reason, '\t'.join(rows[index]), detail)
+            dropped = {index for index, reason, detail in bad}
+            rows = [row for index, row in enumerate(rows) if index not in dropped]
+        errors.clear()
+        return rows, read
+
+    def report_quarantine(self, before=None):
+        """ print the lines quarantined since the counts were before, all of them by default, and close the file """
+        if self.quarantine is None:
+            return
+        self.quarantine.flush()
+        counts = self.quarantine.counts if before is None else self.quarantine.counts - before
+        if counts:
+            print(self.quarantine.summary(counts))
+
+    # Checks for read_file, each returns (index, reason, detail) for the rows of a batch that can't be imported.
+    # They compare the sets of values in a batch first, so a batch without bad rows costs a few set operations
+    def check_majors(self, rows):
+        """ find the rows with a flag other than R or E """
+        if set(map(itemgetter(1), rows)) <= MAJOR_FLAGS:
+            return ()
+        return [(index, 'invalid flag', flag) for index, (major, flag, course) in enumerate(rows) if flag not in MAJOR_FLAGS]
+
+    def check_students(self, rows):
+        """ find the students in a major that isn't in majors.txt """
+        majors = self._majors
+        if set(map(itemgetter(2), rows)) <= majors.keys():
+            return ()
+        return [(index, 'unknown major', major) for index, (cwid, name, major) in enumerate(rows) if major not in majors]
+
+    def check_grades(self, rows):
+        """ find the grades of students or instructors that aren't in students.txt or instructors.txt """
+        students, instructors = self.students, self.instructors
+        if set(map(itemgetter(0), rows)) <= students.keys() and set(map(itemgetter(3), rows)) <= instructors.keys():
+            return ()
+        bad = []
+        for index, (student_cwid, course, grade, instructor_cwid) in enumerate(rows):
+            if student_cwid not in students:
+                bad.append((index, 'unknown student', student_cwid))
+            elif instructor_cwid not in instructors:
+                bad.append((index, 'unknown instructor', instructor_cwid))
+        return bad
 
     # Methods that import data from .txt files, and create instances of classes as values in dicitonaries
     def import_students(self, dir_path):
         """ Pulls student data from .txt file and organizes it into the students dictionary """
         students_file = os.path.join(dir_path, "students.txt")
         try:
-            for cwid, name, major_name in file_reader(students_file, 3, '\t'):
-                self.students[cwid] = Student(cwid, name, major_name, self._majors[major_name])
+            for batch in self.read_file(students_file, 3, shared=SHARED_COLUMNS['students.txt'], check=self.check_students):
+                self.add_students(batch)
         except ValueError as e:
             print(e)
 
+    def add_students(self, rows):
+        """ create a student for each (cwid, name, major_name) row """
+        for cwid, name, major_name in rows:
+            listed = self.students.get(cwid)
+            if listed is not None: # a student listed again keeps the courses, as if all the grades came after the last listing
+                self._major_students[listed.major_name].pop(cwid, None)
+            self._major_students[major_name][cwid] = None
+            if self._enrollments is None:
+                student = self.students[cwid] = Student(cwid, name, major_name, self._majors[major_name])
+                if listed is not None:
+                    student.courses = listed.courses
+            elif listed is None:
+                self.students[cwid] = CompactStudent(cwid, name, major_name, self._majors[major_name], self._enrollments)
+            else:
+                self.students[cwid] = CompactStudent(cwid, name, major_name, self._majors[major_name], self._enrollments, listed._id, listed._last)
+
     def import_instructors(self, dir_path):
         """ Pulls instructor data from .txt file and organizes it into the instructors dictionary """
         instructors_file = os.path.join(dir_path, "instructors.txt")
         try:
-            for cwid, name, department in file_reader(instructors_file, 3, '\t'):
-                self.instructors[cwid] = Instructor(cwid, name, department)
+            for batch in self.read_file(instructors_file, 3, shared=SHARED_COLUMNS['instructors.txt']):
+                self.add_instructors(batch)
         except ValueError as e:
             print(e)        
 
+    def add_instructors(self, rows):
+        """ create an instructor for each (cwid, name, department) row """
+        for cwid, name, department in rows:
+            listed = self.instructors.get(cwid)
+            instructor = self.instructors[cwid] = Instructor(cwid, name, department)
+            if listed is not None: # an instructor listed again keeps the counts, like a student keeps the courses
+                instructor.courses = listed.courses
+
     def import_grades(self, dir_path):
         """ read the grades file, update the student to note the course and grade, update instructor to 
             note an additional student 
         """
+        if self.workers is not None and self.workers > 1 and self._enrollments is None and self.quarantine is None: # the workers stop at a bad line
+            if self.import_grades_parallel(dir_path, self.workers):
+                return # else the rest of the file is read here from the chunk with a grade of an unknown CWID
+
         grades_file = os.path.join(dir_path, "grades.txt")
         try:
-            for student_cwid, course, grade, instructor_cwid in file_reader(grades_file, 4, '\t'):
-                self.students[student_cwid].add_course(course, grade) # adds dictionary entry pair. See def in class Student
-                self.instructors[instructor_cwid].add_course(course) # adds a student to #students in course. See def in Instructor class.
+            for batch in self.read_file(grades_file, 4, shared=SHARED_COLUMNS['grades.txt'], check=self.check_grades): # each batch is a list of rows read from one block of the file
+                self.add_grades(batch)
         except ValueError as e:
             print(e)  
-  
+
+    def add_grades(self, rows):
+        """ note each (student_cwid, course, grade, instructor_cwid) row in the student, the instructor and self._taught """
+        if self._enrollments is not None:
+            for student_cwid, course, grade, instructor_cwid in rows:
+                self.students[student_cwid].add_course(course, grade, instructor_cwid) # appends a row to self._enrollments
+                self.instructors[instructor_cwid].add_course(course)
+        else:
+            for student_cwid, course, grade, instructor_cwid in rows:
+                self.students[student_cwid].add_course(course, grade) # adds dictionary entry pair. See def in class Student
+                self.instructors[instructor_cwid].add_course(course) # adds a student to #students in course. See def in Instructor class.
+        taught = self._taught
+        if taught is not None:
+            for student_cwid, course, grade, instructor_cwid in rows:
+                taught[course][instructor_cwid][student_cwid] = None # a student who takes the course again is kept once
+
+    # Lookups in the indexes. Each returns an iterator over the CWIDs that does work in proportion to the rows it finds.
+    # Like the instructors' counts, the course lookups go by the grades, a student listed again still shows up in them
+    def course_students(self, course):
+        """ return an iterator over the CWIDs of the students who took course, a scan of the students without course_index """
+        self.load_grades()
+        if self._taught is None:
+            return (cwid for cwid, student in self.students.items() if course in student.courses)
+        return unique(self._taught.get(course, {}).values())
+
+    def major_students(self, major):
+        """ return an iterator over the CWIDs of the students in major """
+        return iter(self._major_students.get(major, {}))
+
+    def taught_students(self, instructor_cwid, course):
+        """ return an iterator over the CWIDs of the students that instructor_cwid taught in course """
+        self.load_grades()
+        if self._taught is None: # the students only keep the grades, not who gave them
+            raise ValueError("taught_students needs University(course_index=True)")
+        return iter(self._taught.get(course, {}).get(instructor_cwid, {}))
+
+    def import_grades_parallel(self, dir_path, workers):
+        """ parse byte ranges of the grades file in a pool of worker processes and merge their partial results
+            in file order, which leaves the students and instructors exactly as import_grades would.
+            Return False if a chunk has a grade of a student or instructor that wasn't imported, the chunks before it are merged
+            and self._files points at its start for import_grades to find the bad line in it. After a line with the wrong
+            number of fields self._files points at that line
+        """
+        grades_file = os.path.join(dir_path, "grades.txt")
+        if not os.path.exists(grades_file):
+            print("can't open", grades_file)
+            return True
+
+        size = os.path.getsize(grades_file)
+        chunks = line_chunks(grades_file, workers * 4, size) # more chunks than workers so a slow chunk doesn't hold up the pool
+        executor = ProcessPoolExecutor(workers)
+        line_number = 0 # number of lines in the chunks merged so far
+        merged = size # offset of the end of the chunks merged so far
+        copies = self.symbols.copies
+        try:
+            results = executor.map(import_grades_chunk, *zip(*[(grades_file, start, stop, '\t', self.course_index) for start, stop in chunks]))
+            for (start, stop), (values, courses, counts, taught, rows, error) in zip(chunks, results):
+                if not (courses.keys() <= self.students.keys() and counts.keys() <= self.instructors.keys()):
+                    merged = start
+                    break
+                with self.timed('merge grades'):
+                    # the values come unpickled from the worker, each is exchanged once for its copy in self.symbols like the
+                    # readers' values, then the ids are looked up with map so no Python code runs per grade
+                    value = list(map(copies.setdefault, values, values)).__getitem__
+                    for student_cwid, student_courses in courses.items():
+                        self.students[student_cwid].add_courses(dict(zip(map(value, student_courses), map(value, student_courses.values()))))
+                    for instructor_cwid, instructor_counts in counts.items():
+                        self.instructors[instructor_cwid].add_counts(dict(zip(map(value, instructor_counts), instructor_counts.values())))
+                    for course, instructor_students in taught.items():
+                        for instructor_id, students in instructor_students.items():
+                            self._taught[value(course)][value(instructor_id)].update(dict.fromkeys(map(value, students)))
+                line_number += rows
+                if self.instruments is not None:
+                    self.instruments.count('import_grades', rows)
+                if error is not None:
+                    error = list(error)
+                    error[4] += line_number - rows # line numbers from the worker count from the start of its chunk
+                    print(ValueError(*error))
+                    merged = line_offset(grades_file, start, rows) # the bad line, like read_file
+                    break
+        finally:
+            executor.shutdown(cancel_futures=True)
+            self._files[grades_file] = (merged, line_number, fingerprint(grades_file, merged))
+        return merged == size
+
     def import_majors(self, dir_path):
         """ reads majors from file in dir_path and adds them to a dictionary self._majors """
         majors_file = os.path.join(dir_path, "majors.txt")
         try:
-            for major, flag, course in file_reader(majors_file, 3, separator='\t', header=False):
-                if major not in self._majors:
-                    self._majors[major] = Major(major)
-
-                self._majors[major].add_course(flag, course)
+            for batch in self.read_file(majors_file, 3, shared=SHARED_COLUMNS['majors.txt'], check=self.check_majors):
+                self.add_majors(batch)
         except ValueError as e:
             print(e)
 
-    # Print summary information as tables
-    def student_prettytable(self):
-        """ create a student pretty table with info the student and courses """
-        student_prettytable = PrettyTable() # initialize pt
-        student_prettytable.field_names = Student.pt_header(self) #set headers as defined in function inside Student class
-        for student in self.students.values():
-            student_prettytable.add_row(student.pt_row()) # add rows using the output of pt_row defined in Student class
-        return student_prettytable
+    def add_majors(self, rows):
+        """ note each (major, flag, course) row in its major, creating the major the first time it is seen """
+        for major, flag, course in rows:
+            if major not in self._majors:
+                self._majors[major] = Major(major, cache=self.remaining_cache, symbols=self.symbols)
 
-    def instructor_prettytable(self):
-        """ create an instructor pretty table with info the instructor and courses """
-        instructor_prettytable = PrettyTable()
-        instructor_prettytable.field_names = Instructor.pt_header(self)
-        for row in Instructor.pt_row(self): #for each list in the set of lists returned by pt_row (each list is a row)
-            instructor_prettytable.add_row(row) #add it to the pt
-        return instructor_prettytable
+            self._majors[major].add_course(flag, course)
 
-    def major_prettytable(self):
-        """ create a pretty table containing information of courses associated with majors """
-        major_prettytable = PrettyTable() # initialize pt
-        major_prettytable.field_names = Major.pt_header(self) #set headers as defined in function inside Student class
+    def refresh(self):
+        """ import the lines appended to the data files since they were last read and return (students, instructors),
+            the sets of CWIDs of the students and instructors whose summary rows may have changed.
+            If a file was truncated or rewritten instead of appended to, everything is imported again
+        """
+        for file_name, (offset, lines, checksum) in self._files.items():
+            if not os.path.exists(file_name) or os.path.getsize(file_name) < offset or fingerprint(file_name, offset) != checksum:
+                self.load(self.dir_path)
+                return set(self.__dict__.get('students', ())), set(self.__dict__.get('instructors', ())) # nothing is imported yet in lazy mode
+
+        majors, students, instructors = set(), set(), set()
+        quarantined = None if self.quarantine is None else self.quarantine.counts.copy()
+        with gc_paused():
+            # (file, fields per line, method that adds the rows, check for read_file, [(column, set of the keys it changes)])
+            for name, fields_per_line, add, check, changes in (
+                    ('majors.txt', 3, self.add_majors, self.check_majors, [(0, majors)]),
+                    ('students.txt', 3, self.add_students, self.check_students, [(0, students)]),
+                    ('instructors.txt', 3, self.add_instructors, None, [(0, instructors)]),
+                    ('grades.txt', 4, self.add_grades, self.check_grades, [(0, students), (3, instructors)])):
+                file_name = os.path.join(self.dir_path, name)
+                if not os.path.exists(file_name) or (self.lazy and file_name not in self._files): # a lazy file is read in full when it's needed
+                    continue
+                try:
+                    for batch in self.read_file(file_name, fields_per_line, SHARED_COLUMNS[name], appended=True, check=check):
+                        add(batch)
+                        for column, keys in changes:
+                            keys.update(row[column] for row in batch)
+                except ValueError as e:
+                    print(e)
+        self.report_quarantine(quarantined)
+
+        if majors: # a new required course or elective changes what every student of the major has left
+            students.update(cwid for cwid, student in self.__dict__.get('students', {}).items() if student.major_name in majors)
+        return students, instructors
+
+    def iter_remaining(self):
+        """ generate cwid, (completed_courses, remaining_required, remaining_electives) for every student, see Major.remaining """
+        self.load_grades()
+        for cwid, student in self.students.items():
+            yield cwid, student.compute_remaining()
+
+    def student_rows(self):
+        """ generate the rows of the student summary one student at a time """
+        students = self.students
+        for cwid, (completed_courses, remaining_required, remaining_electives) in self.iter_remaining():
+            student = students[cwid]
+            yield [cwid, student.name, student.major_name, completed_courses, remaining_required, remaining_electives]
+
+    def major_rows(self):
+        """ generate the major, required courses and elective courses of each major """
         for major in self._majors.values():
-            major_prettytable.add_row(major.pt_row()) # add rows using the output of pt_row defined in Student class
-        return major_prettytable
+            yield major.pt_row()
+
+    def grade_stats(self):
+        """ return the GradeStats of every student, computed in one pass over the grades """
+        self.load_grades()
+        with gc_paused(), self.timed('grade_stats'):
+            stats = GradeStats(self.students.values())
+        if self.instruments is not None:
+            self.instruments.count('grade_stats', len(stats))
+        return stats
+
+
+def column_widths(field_names, rows):
+    """ return the width of each column of a table with field_names and rows, as PrettyTable would print it """
+    widths = list(map(len, field_names))
+    for row in rows:
+        widths = list(map(max, widths, map(len, map(str, row))))
+    return widths
+
+def table_lines(field_names, rows, widths):
+    """ generate the lines of a table with field_names and rows in the default PrettyTable style with fixed column widths """
+    rule = '+' + '+'.join('-' * (width + 2) for width in widths) + '+'
+    yield rule
+    yield '| ' + ' | '.join(map(str.center, field_names, widths)) + ' |'
+    yield rule
+    for row in rows:
+        yield '| ' + ' | '.join(map(str.center, map(str, row), widths)) + ' |'
+    yield rule
+
+
+def load_university_state(dir_path, options):
+    """ import the University in dir_path with options in a worker process and return its state """
+    return University(dir_path, **options).state()
+
+def merge_majors(majors):
+    """ return one Major with the required courses and electives of the same major in several shards, the first shard's
+        Major if they all agree. The passing grades are the first shard's
+    """
+    major = majors[0]
+    if all(other._required == major._required and other._electives == major._electives for other in majors[1:]):
+        return major
+    merged = Major(major._department, major.passing_grades)
+    for major in majors:
+        merged._required |= major._required
+        merged._electives |= major._electives
+    return merged
+
+def merge_students(students, majors):
+    """ return one Student with the courses of the same student in several shards, a later shard's grade replaces
+        an earlier one like a later row of grades.txt does. The student's major is the one in majors, from merge_majors
+    """
+    last = students[-1]
+    major = majors.get(last.major_name, last.major)
+    if len(students) == 1 and last.major is major:
+        return last
+    merged = Student(last.cwid, last.name, last.major_name, major)
+    for student in students:
+        merged.courses.update(student.courses)
+    return merged
+
+def merge_instructors(instructors):
+    """ return one Instructor with the students per course of the same instructor in several shards added up """
+    if len(instructors) == 1:
+        return instructors[0]
+    merged = Instructor(instructors[0].cwid, instructors[0].name, instructors[0].department)
+    for instructor in instructors:
+        merged.add_counts(instructor.courses)
+    return merged
+
+
+class MergedView(Mapping):
+    """ A read-only dict over the same dict of several University shards that copies nothing. A key gives merge(values)
+    of the values of the shards that have it, in shard order, on each lookup. merge returns a lone value that needs
+    no merging as it is """
+    def __init__(self, mappings, merge):
+        self.mappings = mappings
+        self.merge = merge
+
+    def __getitem__(self, key):
+        values = [mapping[key] for mapping in self.mappings if key in mapping]
+        if not values:
+            raise KeyError(key)
+        return self.merge(values)
+
+    def __contains__(self, key):
+        return any(key in mapping for mapping in self.mappings)
+
+    def __iter__(self):
+        """ generate each key once, in the order of the first shard that has it """
+        for number, mapping in enumerate(self.mappings):
+            earlier = self.mappings[:number]
+            for key in mapping:
+                if not any(key in other for other in earlier):
+                    yield key
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+
+class ShardedUniversity(University):
+    """ A University over many directories of the four data files, one per campus and term. Each directory is
+    imported into its own University, in a pool of threads or with processes=N in worker processes that parse the
+    files and send the imported state back. students and instructors are MergedViews over the shards, so the reports
+    combine the shards without one big copy of their data. _majors holds the majors merged by merge_majors, a merged
+    student has the merged major, so the major summary and the students' remaining courses agree. options go to every shard's University,
+    except lazy, which isn't supported, and instruments, which times the phases of the sharded University only:
+    'load shards' and the reports. quarantine is a file name relative to each directory, every shard has its own """
+    def __init__(self, dir_paths, processes=None, threads=4, **options):
+        if options.get('lazy'):
+            raise ValueError("ShardedUniversity imports every shard, it can't be lazy")
+        if options.get('quarantine') is not None and os.path.isabs(options['quarantine']):
+            raise ValueError(f"ShardedUniversity needs a quarantine file name relative to each directory, not {options['quarantine']}")
+        self.dir_paths = list(dir_paths)
+        self.processes = processes # number of worker processes, None imports in threads of this process
+        self.threads = threads
+        self.cache_size = options.get('cache_size')
+        super().__init__(self.dir_paths, **options)
+
+    def load(self, dir_paths):
+        """ import every directory of dir_paths into a shard """
+        options = dict(reader=self.reader, workers=self.workers, compact=self.compact, snapshot=self.snapshot, cache_size=self.cache_size,
+                       course_index=self.course_index)
+        quarantine = None if self.quarantine is None else self.quarantine.file_name
+        self.remaining_cache.clear()
+        self._files = dict()
+        self._grades_loaded = True
+        with self.timed('load shards'):
+            if self.processes is not None and self.processes > 1:
+                self.universities = []
+                with ProcessPoolExecutor(self.processes) as executor:
+                    states = executor.map(load_university_state, dir_paths,
+                                          [dict(options, quarantine=None if quarantine is None else os.path.join(dir_path, quarantine)) for dir_path in dir_paths])
+                    for dir_path, state in zip(dir_paths, states):
+                        shard = University(dir_path, pool=self.pool, lazy=True, **options) # imports nothing, restore_state fills it
+                        shard.lazy = False
+                        if quarantine is not None: # the worker wrote the file, restore_state only takes over its counts
+                            shard.quarantine = Quarantine(os.path.join(dir_path, quarantine))
+                        shard.restore_state(state, dir_path)
+                        self.universities.append(shard)
+            else:
+                with ThreadPoolExecutor(self.threads) as executor:
+                    self.universities = list(executor.map(lambda dir_path: University(dir_path, pool=self.pool, **options,
+                                                                                      quarantine=None if quarantine is None else os.path.join(dir_path, quarantine)),
+                                                          dir_paths))
+        self.merge()
+
+    def merge(self):
+        """ make students and instructors new MergedViews over the dicts of the shards and merge the majors """
+        self.students = MergedView([shard.students for shard in self.universities], lambda students: merge_students(students, self._majors))
+        self.instructors = MergedView([shard.instructors for shard in self.universities], merge_instructors)
+        self.merge_majors()
+
+    def merge_majors(self):
+        """ set _majors to the majors of the shards merged by merge_majors, in the order the shards list them """
+        self._majors = dict(MergedView([shard._majors for shard in self.universities], merge_majors))
+
+    def state(self):
+        """ a ShardedUniversity has no state of its own, each of its universities has one with its own Symbols and indexes """
+        raise TypeError("ShardedUniversity has no state, take the state of each University in universities")
+
+    def data_files(self):
+        return [file_name for shard in self.universities for file_name in shard.data_files()]
+
+    def refresh(self):
+        """ refresh every shard and return the CWIDs of the students and instructors that changed in any of them """
+        students, instructors = set(), set()
+        for shard in self.universities:
+            shard_students, shard_instructors = shard.refresh()
+            students |= shard_students
+            instructors |= shard_instructors
+        # a shard whose files were rewritten imported them again into new dicts, new views tell a LiveSummary to start over
+        if any(shard.students is not students for shard, students in zip(self.universities, self.students.mappings)):
+            self.merge()
+        else:
+            self.merge_majors() # a shard may have new courses in a major
+        return students, instructors
+
+    def course_students(self, course):
+        return unique(shard.course_students(course) for shard in self.universities)
+
+    def major_students(self, major):
+        return unique(shard.major_students(major) for shard in self.universities)
+
+    def taught_students(self, instructor_cwid, course):
+        return unique(shard.taught_students(instructor_cwid, course) for shard in self.universities)
+
+    def instructor_rows(self):
+        """ generate the rows of the instructor summary from the merged students per course of each instructor,
+            the database only has the data of one directory
+        """
+        for instructor in self.instructors.values():
+            for course, students in instructor.courses.items():
+                yield [instructor.cwid, instructor.name, instructor.department, course, students]
+
+
+
+def split_courses(courses):
+    """ turn a list of courses joined with COURSE_SEPARATOR by the SQL summaries into a set """
+    return set(courses.split(COURSE_SEPARATOR)) if courses else set()
+
+def paged(cursor, page_size=EXPORT_BATCH):
+    """ generate the rows of cursor, fetching page_size rows at a time """
+    while True:
+        rows = cursor.fetchmany(page_size)
+        if not rows:
+            return
+        yield from rows
+
+
+class SQLUniversity(Summaries):
+    """ The summaries of University built by set-based SQL over the HW11 tables of the database in pool, one row per
+    student, major or instructor course, fetched a page at a time. Nothing is imported from the text files, load them
+    into the database with load_database. The reports and exports are those of Summaries, so both engines print the
+    same tables. The student summary uses PASSING_GRADES. The lookups of University need what it imports and
+    aren't offered here """
+    def __init__(self, pool=None, page_size=EXPORT_BATCH, instruments=None):
+        self.pool = ConnectionPool() if pool is None else pool
+        self.page_size = page_size
+        self.instruments = instruments
+
+    def query(self, sql, parameters=()):
+        """ generate the rows of sql in this thread's connection a page at a time """
+        return paged(self.pool.connection().execute(sql, parameters), self.page_size)
+
+    def student_rows(self):
+        """ generate the rows of the student summary from STUDENT_SUMMARY """
+        passing = sorted(PASSING_GRADES)
+        sql = STUDENT_SUMMARY.replace('{passing}', ', '.join('?' * len(passing)))
+        for cwid, name, major_name, completed, remaining_required, remaining_electives in self.query(sql, passing * 3):
+            yield [cwid, name, major_name, split_courses(completed), split_courses(remaining_required),
+                   None if remaining_electives is None else split_courses(remaining_electives)]
+
+    def major_rows(self):
+        """ generate the major, required courses and elective courses of each major from MAJOR_SUMMARY """
+        for major, required, electives in self.query(MAJOR_SUMMARY):
+            yield [major, split_courses(required), split_courses(electives)]
+
+    def grade_stats(self):
+        """ return the GradeStats of every student from STUDENT_GRADES, with the PASSING_GRADES of every major """
+        with gc_paused(), self.timed('grade_stats'):
+            return GradeStats(self.grade_students())
+
+    def grade_students(self):
+        """ generate a Student with the last grade of each course for every student in the database """
+        major = Major(None)
+        for cwid, rows in groupby(self.query(STUDENT_GRADES), key=lambda row: row[0]):
+            rows = list(rows)
+            student = Student(cwid, None, rows[0][1], major)
+            student.courses = {course: grade for cwid, major_name, course, grade in rows if course is not None}
+            yield student
+
+
+ENGINES = {'text': University, 'sql': SQLUniversity} # the ways open_university can build the summaries
+
+def open_university(dir_path, engine='text', db_file=DB_FILE, **options):
+    """ return a University that imports the text files in dir_path (engine='text') or an SQLUniversity over db_file
+        (engine='sql'), both with the same reports. options go to the class of the engine
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine}, choose one of {', '.join(ENGINES)}")
+    pool = options.pop('pool', None) or ConnectionPool(db_file)
+    if engine == 'sql':
+        return SQLUniversity(pool, **options)
+    return University(dir_path, pool=pool, **options)
 
 
 class Student:
     """ Keeps track of all information concerning students, 
     including what happens when a student takes a new course """
+    __slots__ = ('cwid', 'name', 'major_name', 'major', 'courses') # no per-instance __dict__, there can be millions of students
+
     def __init__(self, cwid, name, major_name, major):
         self.cwid = cwid
         self.name = name
@@ -131,6 +1646,24 @@ class Student:
     def add_course(self, course, grade):
         """ note that the student took a course and earned a grade """
         self.courses[course] = grade
+        if self.major.cache is not None:
+            self.major.cache.discard(self.cwid)
+
+    def add_courses(self, courses):
+        """ note several courses at once, courses[course] = grade """
+        self.courses.update(courses)
+        if self.major.cache is not None:
+            self.major.cache.discard(self.cwid)
+
+    def remaining(self):
+        """ return completed_courses, remaining_required, remaining_electives of the student, see Major.remaining """
+        if self.major.cache is None:
+            return self.compute_remaining()
+        return self.major.cache.remaining(self)
+
+    def compute_remaining(self):
+        """ work out remaining() without the cache """
+        return self.major.remaining(self.courses)
              
     def pt_header(self):
         """ return a list of the fields in the prettytable """
@@ -138,13 +1671,164 @@ class Student:
 
     def pt_row(self):
         """ return the values for the students pretty table for self """
-        completed_courses, remaining_required, remaining_electives = self.major.remaining(self.courses)
+        completed_courses, remaining_required, remaining_electives = self.remaining()
         return [self.cwid, self.name, self.major_name, completed_courses, remaining_required, remaining_electives]
-        
-            
+
+
+class CompactStudent(Student):
+    """ A Student whose courses live in the University's Enrollments columns instead of a dict of its own.
+    courses is rebuilt from the student's enrollment rows each time it is read """
+    __slots__ = ('_enrollments', '_id', '_last') # _last is the student's newest row in _enrollments, -1 before the first course
+
+    def __init__(self, cwid, name, major_name, major, enrollments, number=None, last=-1):
+        self.cwid = cwid
+        self.name = name
+        self.major_name = major_name
+        self.major = major
+        self._enrollments = enrollments
+        self._id = enrollments.add_student(cwid) if number is None else number # a number and last row are given when restoring a snapshot
+        self._last = last
+
+    @property
+    def courses(self):
+        """ the student's courses as a dictionary of course=grade, a later grade for the same course replaces an earlier one """
+        return self._enrollments.courses(self._last)
+
+    def add_course(self, course, grade, instructor_cwid=None):
+        """ note that the student took a course and earned a grade """
+        self._last = self._enrollments.add(self._id, course, grade, instructor_cwid, self._last)
+        if self.major.cache is not None:
+            self.major.cache.discard(self.cwid)
+
+    def add_courses(self, courses):
+        """ note several courses at once, courses[course] = grade """
+        for course, grade in courses.items():
+            self.add_course(course, grade)
+
+    def compute_remaining(self):
+        """ work out remaining() with Major.remaining_ids over the ids in the enrollment rows, without building courses,
+            when the major numbers its courses with the same Symbols as the enrollments
+        """
+        major, enrollments = self.major, self._enrollments
+        if major.symbols is None or major.symbols is not enrollments.course_codes:
+            return major.remaining(self.courses)
+        courses = enrollments.ids(self._last)
+        completed, remaining_required, remaining_electives = major.remaining_ids(courses)
+        # the course names go into the sets in the order Major.remaining adds them, so the sets print the same
+        value = major.symbols.values.__getitem__
+        completed_courses = set(map(value, filter(completed.__contains__, courses)))
+        return completed_courses, major._required - completed_courses, None if remaining_electives is None else major._electives
+
+
+class Codes:
+    """ Numbers distinct values in the order they are first seen """
+    __slots__ = ('values', '_ids')
+
+    def __init__(self):
+        self.values = list() # self.values[id] = value
+        self._ids = dict() # self._ids[value] = id
+
+    def __len__(self):
+        return len(self.values)
+
+    def code(self, value):
+        """ return the id of value, numbering it if it is new """
+        code = self._ids.get(value)
+        if code is None:
+            code = self._ids[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class Symbols(Codes):
+    """ The symbol table of a University. copies holds the one copy of every course, grade, major, department and CWID
+    read from any of its files, the readers look up each value of their shared columns there. Like Codes it numbers
+    the values that need an id, the grades of GRADE_POINTS first so a column of grade ids fits in bytes """
+    __slots__ = ('copies',)
+
+    def __init__(self):
+        super().__init__()
+        self.copies = dict() # self.copies[value] = the one copy of value
+        for grade in GRADE_POINTS:
+            self.code(self.intern(grade))
+
+    def intern(self, value):
+        """ return the copy of value in the table, adding value if it is new """
+        return self.copies.setdefault(value, value)
+
+
+WIDER = {'b': 'h', 'h': 'i', 'i': 'q'} # the next signed array typecode that holds larger integers
+
+def append_widening(column, value):
+    """ append value to the integer array column and return the column, or a wider copy of it if value didn't fit """
+    try:
+        column.append(value)
+    except OverflowError:
+        column = append_widening(array(WIDER[column.typecode], column), value)
+    return column
+
+
+class Enrollments:
+    """ Column storage of every (student, course, grade, instructor) enrollment for University(compact=True).
+    Courses, grades and instructors are numbered by Codes, the University's Symbols when given, and students by the order
+    they were added, the columns hold those numbers in the narrowest array type that fits. The rows of one student are
+    chained together through previous, so a student only has to remember its newest row """
+    __slots__ = ('student', 'course', 'grade', 'instructor', 'previous', 'student_cwids', 'course_codes', 'grade_codes', 'instructor_codes')
+
+    def __init__(self, symbols=None):
+        self.student = array('h') # self.student[row] = number of the student
+        self.course = array('h') # self.course[row] = id of the course in course_codes
+        self.grade = array('b') # self.grade[row] = id of the grade in grade_codes
+        self.instructor = array('h') # self.instructor[row] = id of the instructor's CWID in instructor_codes, -1 if unknown
+        self.previous = array('h') # self.previous[row] = the student's row before this one, -1 for the first
+        self.student_cwids = list() # self.student_cwids[number] = CWID of the student
+        self.course_codes = Codes() if symbols is None else symbols
+        self.grade_codes = Codes() if symbols is None else symbols
+        self.instructor_codes = Codes() if symbols is None else symbols
+
+    def __len__(self):
+        return len(self.student)
+
+    def add_student(self, cwid):
+        """ number a new student """
+        self.student_cwids.append(cwid)
+        return len(self.student_cwids) - 1
+
+    def add(self, student, course, grade, instructor_cwid, previous):
+        """ append an enrollment of student number student after its row previous and return the new row """
+        self.student = append_widening(self.student, student)
+        self.course = append_widening(self.course, self.course_codes.code(course))
+        self.grade = append_widening(self.grade, self.grade_codes.code(grade))
+        self.instructor = append_widening(self.instructor, -1 if instructor_cwid is None else self.instructor_codes.code(instructor_cwid))
+        self.previous = append_widening(self.previous, previous)
+        return len(self.student) - 1
+
+    def rows(self, last):
+        """ return the rows of the chain that ends at last, oldest first """
+        rows = []
+        while last != -1:
+            rows.append(last)
+            last = self.previous[last]
+        rows.reverse()
+        return rows
+
+    def courses(self, last):
+        """ return course=grade for the chain of rows that ends at last """
+        courses, grades = self.course_codes.values, self.grade_codes.values
+        course, grade = self.course, self.grade
+        return {courses[course[row]]: grades[grade[row]] for row in self.rows(last)}
+
+    def ids(self, last):
+        """ return course id=grade id for the chain of rows that ends at last, see Major.remaining_ids """
+        rows = self.rows(last)
+        return dict(zip(map(self.course.__getitem__, rows), map(self.grade.__getitem__, rows)))
+
+
 class Instructor:
     """ Keeps track of all information concerning Instructors, 
     including what happens to the instructor data when a student takes a new course """
+    __slots__ = ('cwid', 'department', 'name', 'courses')
+
     def __init__(self, cwid, name, department):
         self.cwid = cwid
         self.department = department
@@ -155,30 +1839,41 @@ class Instructor:
         """ tell the instructor that she taught a student in a course """
         self.courses[course] += 1
 
+    def add_counts(self, counts):
+        """ tell the instructor about several students at once, counts[course] = number of students """
+        courses = self.courses # adds the counts with map, no Python code runs per course
+        courses.update(zip(counts, map(add, map(courses.__getitem__, counts), counts.values())))
+
     def pt_header(self):
         return ['CWID', 'Name', 'Department', 'Course', '#Students']
 
-    def pt_row(self): #new instructor.pt_row returns 10 lists, each list will be a row
-        """ a generator to return the rows with course and number of students """
-        return list(db.execute("""
-            select I.CWID, I.Name, I.Dept, G.Course, count(*) as StudentPerClass 
-            FROM HW11_instructors I
-            join HW11_grades G
-            on I.CWID = G.Instructor_CWID
-            group by G.Course"""))
+    @staticmethod
+    def pt_row(pool): #new instructor.pt_row returns 10 lists, each list will be a row
+        """ return the rows with course and number of students from the database in pool """
+        return pool.execute(INSTRUCTOR_SUMMARY)
         
 
 
+PASSING_GRADES = frozenset({'A', 'A-', 'B+', 'B', 'B-', 'C+', 'C'}) # shared by every Major that doesn't set its own
+MAJOR_FLAGS = frozenset({'R', 'E', 'r', 'e'}) # the flags Major.add_course accepts
+
+
 class Major:
     """ Track all the information regarding the major, inlcuding its required and elective courses """
-    def __init__(self, department, passing=None):
+    __slots__ = ('_department', '_required', '_electives', 'passing_grades', 'cache', 'version', 'symbols', '_ids')
+
+    def __init__(self, department, passing=None, cache=None, symbols=None):
         self._department = department
         self._required = set()
         self._electives = set()
         if passing is None:
-            self.passing_grades = {'A', 'A-', 'B+', 'B', 'B-', 'C+', 'C'}
+            self.passing_grades = PASSING_GRADES
         else:
             self.passing_grades = passing
+        self.cache = cache # the RemainingCache for the students of this major, None computes every time
+        self.version = 0 # counts the changes to the courses, results cached before the last change are stale
+        self.symbols = symbols # the Symbols that number the courses and grades for remaining_ids
+        self._ids = None # (version, required, electives, passing) as sets of ids, numbered again when the version changes
 
     def add_course(self, flag, course):
         """ notes another required course or elective """
@@ -188,6 +1883,7 @@ class Major:
             self._required.add(course)
         else:
             raise ValueError(f"Flag {flag} is invalid for course {course}")
+        self.version += 1
 
     def pt_header(self):
         """ return a list of the fields in the prettytable """
@@ -208,40 +1904,1019 @@ class Major:
             remaining_electives = self._electives
         return completed_courses, remaining_required, remaining_electives
 
+    def remaining_ids(self, courses):
+        """ Major.remaining over the ids of self.symbols: courses maps course id=grade id for a single student, like
+            Enrollments.ids, and completed_courses, remaining_required, remaining_electives are sets of ids
+        """
+        if self._ids is None or self._ids[0] != self.version:
+            code = self.symbols.code
+            self._ids = (self.version, {code(course) for course in self._required}, {code(course) for course in self._electives},
+                         {code(grade) for grade in self.passing_grades})
+        version, required, electives, passing = self._ids
+        completed_courses = {course for course, grade in courses.items() if grade in passing}
+        remaining_required = required - completed_courses
+        remaining_electives = None if electives.intersection(completed_courses) else electives
+        return completed_courses, remaining_required, remaining_electives
+
+
+
+GRADE_POINTS = {'A': 4.0, 'A-': 3.75, 'B+': 3.25, 'B': 3.0, 'B-': 2.75, 'C+': 2.25, 'C': 2.0,
+                'C-': 0.0, 'D+': 0.0, 'D': 0.0, 'D-': 0.0, 'F': 0.0} # a grade missing here doesn't count toward the GPA
+
+
+class GradeStats:
+    """ Grade aggregates of many students as columns, row i of every column belongs to the student cwids[i], and the
+    grade distribution of every course. Only the last grade of a student in a course counts, like Student.courses.
+    The files have no credit hours, so every course counts as one credit """
+    __slots__ = ('cwids', 'majors', 'gpa', 'points', 'credits', 'passed', 'failed', '_grades', '_major_rows')
+
+    def __init__(self, students, points=GRADE_POINTS):
+        self.cwids = list() # self.cwids[i] = CWID of student i
+        self.majors = list() # self.majors[i] = major of student i
+        self.gpa = array('d') # self.gpa[i] = mean grade points of the courses with points, 0.0 without any
+        self.points = array('d') # self.points[i] = sum of the grade points, gpa * credits
+        self.credits = array('i') # self.credits[i] = number of courses with grade points
+        self.passed = array('i') # self.passed[i] = number of courses with a passing grade of the student's major
+        self.failed = array('i') # self.failed[i] = number of the other courses
+        self._grades = Counter() # self._grades[course, grade] = number of students whose last grade in course is grade
+        self._major_rows = defaultdict(partial(array, 'i')) # self._major_rows[major] = the rows of the major's students
+
+        cwids, majors, gpa, points_column = self.cwids, self.majors, self.gpa, self.points
+        credits, passed, failed, major_rows = self.credits, self.passed, self.failed, self._major_rows
+        count = self._grades.update # counts the (course, grade) pairs of a student in C
+        for student in students:
+            courses = student.courses
+            grades = courses.values()
+            scored = [points[grade] for grade in grades if grade in points]
+            passing = sum(map(student.major.passing_grades.__contains__, grades))
+            cwids.append(student.cwid)
+            majors.append(student.major_name)
+            major_rows[student.major_name].append(len(cwids) - 1)
+            total = sum(scored)
+            gpa.append(total / len(scored) if scored else 0.0)
+            points_column.append(total)
+            credits.append(len(scored))
+            passed.append(passing)
+            failed.append(len(courses) - passing)
+            count(courses.items())
+
+    def __len__(self):
+        return len(self.cwids)
+
+    def distribution(self, course):
+        """ return grade=number of students for course """
+        return {grade: students for (name, grade), students in self._grades.items() if name == course}
+
+    def distributions(self):
+        """ return course={grade: number of students} for every course """
+        courses = defaultdict(dict)
+        for (course, grade), students in self._grades.items():
+            courses[course][grade] = students
+        return dict(courses)
+
+    def by_major(self):
+        """ return major=(students, gpa, passed, failed) with the GPA over all the credits of the major's students.
+            Each sum maps the rows of the major over a column, without a Python loop per student
+        """
+        majors = dict()
+        for major, rows in self._major_rows.items():
+            points, credits = sum(map(self.points.__getitem__, rows)), sum(map(self.credits.__getitem__, rows))
+            majors[major] = (len(rows), points / credits if credits else 0.0,
+                             sum(map(self.passed.__getitem__, rows)), sum(map(self.failed.__getitem__, rows)))
+        return majors
+
+
+class UniversityService:
+    """ Answers queries about one loaded University for many asyncio clients. A student is looked up in memory,
+    an instructor's courses come from the SQL query of Instructor.pt_row, run in a thread pool so the event loop never
+    waits on SQLite. While a lazy University imports files on access, the lookups run in the thread pool too, one at a time.
+    At most max_pending queries are answered at a time, the others wait for a free slot, and each
+    connection reads its next request only after its last answer was sent, so a busy server slows its clients down
+    instead of queueing without limit """
+    def __init__(self, university, max_pending=64, threads=4):
+        if not isinstance(university, University):
+            raise TypeError(f"UniversityService needs a University, not {type(university).__name__}")
+        self.university = university
+        self.executor = ThreadPoolExecutor(threads) # each thread gets its own connection from university.pool
+        self._slots = asyncio.Semaphore(max_pending)
+        self._loading = threading.Lock() # one thread looks up in a lazy University that may import files, the others wait for it
 
-def main():
-    stevens = University('G:\My Drive\F18\SSW-810\Week 10')
-    print("Student Summary")
-    student_summary = print(stevens.student_prettytable())
-    print("Instructor Summary")
-    instructor_summary = print(stevens.instructor_prettytable())
-    print("Major Summary")
-    major_summary = print(stevens.major_prettytable())
+    async def lookup(self, function, *args):
+        """ return function(*args), called in the thread pool while the university may import a file for it """
+        if self.university._grades_loaded:
+            return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.locked, function, *args)
+
+    def locked(self, function, *args):
+        """ call function(*args) in the only thread that looks up in a lazy university """
+        with self._loading:
+            return function(*args)
+
+    def student(self, cwid):
+        """ return the summary row of the student with cwid as a dict, None for an unknown CWID """
+        student = self.university.student(cwid)
+        if student is None:
+            return None
+        cwid, name, major_name, completed_courses, remaining_required, remaining_electives = student.pt_row()
+        return {'cwid': cwid, 'name': name, 'major': major_name, 'completed': sorted(completed_courses), 'remaining_required': sorted(remaining_required),
+                'remaining_electives': None if remaining_electives is None else sorted(remaining_electives)}
+
+    async def instructor(self, cwid):
+        """ return the instructor with cwid and the number of students in each of the instructor's courses as a dict,
+            None for an unknown CWID
+        """
+        instructor = await self.lookup(lambda: self.university.instructors.get(cwid))
+        if instructor is None:
+            return None
+        rows = await asyncio.get_running_loop().run_in_executor(self.executor, self.university.pool.execute, INSTRUCTOR_COURSES, (cwid,))
+        return {'cwid': cwid, 'name': instructor.name, 'department': instructor.department,
+                'courses': [[course, students] for cwid, name, department, course, students in rows]}
+
+    async def query(self, line):
+        """ answer a request line, 'student CWID' or 'instructor CWID', with a dict """
+        command, _, cwid = line.strip().partition(' ')
+        async with self._slots:
+            if command == 'student':
+                answer = await self.lookup(self.student, cwid)
+            elif command == 'instructor':
+                answer = await self.instructor(cwid)
+            else:
+                return {'error': f"unknown request {command}"}
+        if answer is None:
+            return {'error': f"unknown {command} {cwid}"}
+        return answer
+
+    async def handle(self, reader, writer):
+        """ answer each line the client sends with a line of JSON until it closes the connection """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                writer.write(json.dumps(await self.query(line.decode('utf-8', 'replace'))).encode() + b'\n')
+                await writer.drain() # waits while the client isn't reading its answers
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=8810):
+        """ start listening for clients on host and port and return the asyncio server """
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        """ stop the threads that run the SQL queries """
+        self.executor.shutdown()
+
+
+def serve(dir_path, host='127.0.0.1', port=8810):
+    """ load the university in dir_path and answer queries on host and port until interrupted """
+    async def run(service):
+        server = await service.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    service = UniversityService(University(dir_path))
+    try:
+        asyncio.run(run(service))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+class RemainingCache:
+    """ Remembers the result of Major.remaining for each student until it changes. Student.add_course drops the
+    student's result and Major.add_course makes the results of all students of the major stale. With maxsize
+    the least recently used results are dropped to keep at most maxsize of them. hits and misses count the lookups """
+    __slots__ = ('maxsize', 'hits', 'misses', '_results')
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._results = dict() if maxsize is None else OrderedDict() # self._results[cwid] = (student, major, version, result)
+
+    def __len__(self):
+        return len(self._results)
+
+    def remaining(self, student):
+        """ return Major.remaining for student, from the cache if it holds a result for the student's current courses """
+        major = student.major
+        entry = self._results.get(student.cwid)
+        if entry is not None and entry[0] is student and entry[1] is major and entry[2] == major.version:
+            self.hits += 1
+            if self.maxsize is not None:
+                self._results.move_to_end(student.cwid)
+            return entry[3]
+
+        self.misses += 1
+        result = student.compute_remaining()
+        self._results[student.cwid] = (student, major, major.version, result)
+        if self.maxsize is not None and len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+        return result
+
+    def discard(self, cwid):
+        """ forget the result of the student with cwid """
+        self._results.pop(cwid, None)
+
+    def clear(self):
+        """ forget every result, the counters keep counting """
+        self._results.clear()
+
+    def stats(self):
+        """ return the counters and the size as a dict """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._results), 'maxsize': self.maxsize}
+
+
+WATCH_INTERVAL = 0.25 # seconds between two looks at the data files in watch mode
+
+
+class LiveSummary:
+    """ The student and instructor summary rows of a University, kept up to date while its data files grow.
+    poll compares the size and modification time of the data files with the last poll and only when one changed
+    imports the new lines with University.refresh, which notes them through Student.add_course and
+    Instructor.add_course, then rebuilds just the rows of the students and instructors refresh returns.
+    The instructor rows come from the instructors in memory, refresh doesn't update the database """
+    def __init__(self, university, interval=WATCH_INTERVAL):
+        if not isinstance(university, University):
+            raise TypeError(f"LiveSummary needs a University, not {type(university).__name__}")
+        self.university = university
+        self.interval = interval
+        self.students = dict() # self.students[cwid] = the student's summary row
+        self.instructors = dict() # self.instructors[cwid] = the instructor's summary rows, one per course
+        self._stats = self.file_stats()
+        self._imported = None # the students and instructors dicts of university, a reload replaces them
+        self.update((), ())
+
+    def file_stats(self):
+        """ return (size, modification time, inode) of each data file, None for a missing one """
+        stats = []
+        for file_name in self.university.data_files():
+            try:
+                stat = os.stat(file_name)
+            except FileNotFoundError:
+                stats.append(None)
+            else:
+                stats.append((stat.st_size, stat.st_mtime_ns, stat.st_ino))
+        return stats
+
+    def poll(self):
+        """ import what was added to the data files since the last poll and update the affected rows,
+            return (students, instructors), the CWIDs whose rows were updated, both empty when no file changed
+        """
+        stats = self.file_stats() # taken before refresh, a file that changes meanwhile is seen by the next poll
+        if stats == self._stats:
+            return set(), set()
+        self._stats = stats
+        students, instructors = self.university.refresh()
+        self.update(students, instructors)
+        return students, instructors
+
+    def update(self, students, instructors):
+        """ rebuild the rows of the students and instructors with these CWIDs, or all the rows after a new import """
+        university = self.university
+        if self._imported is None or self._imported[0] is not university.students or self._imported[1] is not university.instructors:
+            self._imported = (university.students, university.instructors)
+            self.students.clear()
+            self.instructors.clear()
+            students, instructors = university.students, university.instructors
+        for cwid in students:
+            student = university.students.get(cwid)
+            if student is not None:
+                self.students[cwid] = student.pt_row()
+        for cwid in instructors:
+            instructor = university.instructors.get(cwid)
+            if instructor is not None:
+                self.instructors[cwid] = [[cwid, instructor.name, instructor.department, course, count]
+                                          for course, count in instructor.courses.items()]
+
+    def student_rows(self):
+        """ generate the rows of the student summary """
+        return iter(self.students.values())
+
+    def instructor_rows(self):
+        """ generate the rows of the instructor summary """
+        for rows in self.instructors.values():
+            yield from rows
+
+    def watch(self, changed=None, stop=None):
+        """ poll every interval seconds until stop, a threading.Event, is set and call changed(students, instructors)
+            with the CWIDs of the updated rows after each change
+        """
+        stop = threading.Event() if stop is None else stop
+        while not stop.wait(self.interval):
+            students, instructors = self.poll()
+            if (students or instructors) and changed is not None:
+                changed(students, instructors)
+
+
+def watch(dir_path, interval=WATCH_INTERVAL):
+    """ load the university in dir_path, then print the updated summary rows each time its data files change until interrupted """
+    live = LiveSummary(University(dir_path), interval)
+
+    def changed(students, instructors):
+        print("Updated", time.strftime('%H:%M:%S'))
+        for header, rows in ((Student.pt_header(live), [live.students[cwid] for cwid in students if cwid in live.students]),
+                             (Instructor.pt_header(live), [row for cwid in instructors for row in live.instructors.get(cwid, ())])):
+            if rows:
+                table = PrettyTable()
+                table.field_names = header
+                for row in rows:
+                    table.add_row(row)
+                print(table)
+
+    try:
+        live.watch(changed)
+    except KeyboardInterrupt:
+        pass
+
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__)) # the sample .txt files that ship with this repo, read by main and the tests
+SUMMARIES = ('students', 'instructors', 'majors') # the summaries main prints, in this order
+
+def main(instruments=None, summaries=SUMMARIES, lazy=False):
+    """ print the summaries, then the timing report if instruments is an Instrumentation.
+        lazy=True imports only the files the summaries need, the major summary alone reads just majors.txt
+    """
+    stevens = University(DATA_DIR, instruments=instruments, lazy=lazy)
+    timed = stevens.timed
+    if 'students' in summaries:
+        print("Student Summary")
+        stevens.write_student_summary()
+    if 'instructors' in summaries:
+        print("Instructor Summary")
+        instructor_summary = stevens.instructor_prettytable()
+        with timed('render instructor_prettytable'):
+            print(instructor_summary)
+    if 'majors' in summaries:
+        print("Major Summary")
+        major_summary = stevens.major_prettytable()
+        with timed('render major_prettytable'):
+            print(major_summary)
+    if instruments is not None:
+        print("Timing Summary")
+        print(instruments.summary())
 
 
 class UniversityTest(unittest.TestCase):
     def test_student_instance(self):
         """Tests several student instances by comparing the values in the instances to the correct values"""
-        stevens = University('G:\My Drive\F18\SSW-810\Week 10')
+        stevens = University(DATA_DIR)
         self.assertEqual(stevens.students['10175'].name, "Erickson, D")
         self.assertEqual(stevens.students['11461'].name, "Wright, U")
         self.assertEqual(stevens.students['11461'].courses, {'SYS 800': 'A', 'SYS 750': 'A-', 'SYS 611': 'A'})
 
     def test_instructor_instance(self):
         """Tests several instructor instances by comparing the values in the instances to the correct values"""
-        stevens = University('G:\My Drive\F18\SSW-810\Week 10')
+        stevens = University(DATA_DIR)
         self.assertEqual(stevens.instructors['98764'].name, "Feynman, R")
         self.assertEqual(stevens.instructors['98765'].name, "Einstein, A")
         self.assertEqual(stevens.instructors['98760'].courses, {'SYS 800': 1, 'SYS 750': 1, 'SYS 611': 2, 'SYS 645': 1})
 
     def test_major_instance(self):
         """ Tests Major instances to compare to the correct values """
-        stevens = University('G:\My Drive\F18\SSW-810\Week 10')
+        stevens = University(DATA_DIR)
         self.assertEqual(stevens._majors['SFEN']._required, {'SSW 540', 'SSW 555', 'SSW 564', 'SSW 567'})
         self.assertEqual(stevens._majors['SFEN']._electives, {'CS 501', 'CS 545', 'CS 513'})
 
+    def test_file_reader_batches(self):
+        """ Tests that the batched reader returns the same rows as file_reader and reports the bad line number """
+        grades_file = os.path.join(DATA_DIR, 'grades.txt')
+        rows = [row for batch in file_reader_batches(grades_file, 4, '\t', block_size=50) for row in batch]
+        self.assertEqual(rows, list(file_reader(grades_file, 4, '\t')))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            bad_file = os.path.join(tmp, 'bad.txt')
+            with open(bad_file, 'w') as fp:
+                fp.write('a\tb\nc\td\ne\n')
+            rows = []
+            with self.assertRaises(ValueError) as cm:
+                for batch in file_reader_batches(bad_file, 2, '\t', header=True):
+                    rows.extend(batch)
+            self.assertEqual(rows, [('c', 'd')])
+            self.assertEqual(cm.exception.args[4], 3)
+
+    def test_mmap_file_reader(self):
+        """ Tests that the mmap reader returns the same rows as file_reader and shares repeated values """
+        grades_file = os.path.join(DATA_DIR, 'grades.txt')
+        rows = [row for batch in mmap_file_reader(grades_file, 4, '\t', shared=(1,), block_size=50) for row in batch]
+        self.assertEqual(rows, list(file_reader(grades_file, 4, '\t')))
+        self.assertIs(rows[0][1], rows[4][1]) # both rows are for 'SSW 567'
+
+        stevens = University(DATA_DIR, reader=mmap_file_reader)
+        self.assertEqual(stevens.students['11461'].courses, {'SYS 800': 'A', 'SYS 750': 'A-', 'SYS 611': 'A'})
+
+    def test_compact_university(self):
+        """ Tests that the compact storage mode shows the same students as the default one """
+        stevens = University(DATA_DIR)
+        compact = University(DATA_DIR, compact=True)
+        for cwid, student in stevens.students.items():
+            self.assertEqual(list(compact.students[cwid].courses.items()), list(student.courses.items()))
+            self.assertEqual(compact.students[cwid].pt_row(), student.pt_row())
+        self.assertEqual(len(compact._enrollments), 22)
+        compact.students['10103'].add_course('SSW 567', 'B')
+        self.assertEqual(compact.students['10103'].courses['SSW 567'], 'B')
+
+    def test_symbols(self):
+        """ Tests that every file shares one copy of each value, also when the grades are imported in worker processes """
+        stevens = University(DATA_DIR, course_index=True)
+        student = stevens.students['10103']
+        course = next(course for course in student.courses if course == 'SSW 567')
+        self.assertIs(course, next(course for course in stevens._majors['SFEN']._required if course == 'SSW 567'))
+        self.assertIs(course, next(course for course in stevens.instructors['98765'].courses if course == 'SSW 567'))
+        self.assertIs(student.major_name, next(major for major in stevens._majors if major == 'SFEN'))
+        self.assertIs(next(stevens.taught_students('98765', 'SSW 567')), next(cwid for cwid in stevens.students if cwid == '10103'))
+        self.assertIs(stevens.symbols.intern('SSW 567'), course)
+
+        parallel = University(DATA_DIR, workers=2, course_index=True)
+        course = next(course for course in parallel.students['10103'].courses if course == 'SSW 567')
+        self.assertIs(course, next(course for course in parallel._majors['SFEN']._required if course == 'SSW 567'))
+        self.assertIs(course, next(course for course in parallel.instructors['98765'].courses if course == 'SSW 567'))
+        self.assertIs(course, next(course for course in parallel._taught if course == 'SSW 567'))
+        self.assertIs(next(parallel.taught_students('98765', 'SSW 567')), next(cwid for cwid in parallel.students if cwid == '10103'))
+        self.assertIs(parallel.students['10103'].courses['SSW 567'], parallel.symbols.intern('A'))
+        self.assertEqual(University(DATA_DIR, compact=True)._enrollments.grade.typecode, 'b')
+
+    def test_remaining_all(self):
+        """ Tests that the batch remaining computation matches Major.remaining for every student, also over the ids
+            of the compact students """
+        stevens = University(DATA_DIR)
+        remaining = stevens.remaining_all()
+        for cwid, student in stevens.students.items():
+            self.assertEqual(remaining[cwid], student.major.remaining(student.courses))
+        compact = University(DATA_DIR, compact=True)
+        values = compact.symbols.values
+        for cwid, student in compact.students.items():
+            ids = student.major.remaining_ids(compact._enrollments.ids(student._last))
+            self.assertEqual([None if remaining is None else {values[id] for id in remaining} for remaining in ids], list(remaining[cwid]))
+            self.assertEqual(student.compute_remaining(), remaining[cwid])
+        self.assertEqual(compact.remaining_all(), remaining)
+        self.assertEqual(remaining['10103'], ({'SSW 567', 'SSW 564', 'SSW 687', 'CS 501'}, {'SSW 540', 'SSW 555'}, None))
+
+    def test_write_student_summary(self):
+        """ Tests that the streamed student summary is the same text as the student prettytable """
+        stevens = University(DATA_DIR)
+        with tempfile.TemporaryFile('w+') as fp:
+            stevens.write_student_summary(fp)
+            fp.seek(0)
+            self.assertEqual(fp.read(), stevens.student_prettytable().get_string() + '\n')
+        self.assertEqual(list(table_lines(['CWID'], [], [4])), ['+------+', '| CWID |', '+------+', '+------+'])
+
+    def test_export_summary(self):
+        """ Tests that the exported summaries have the prettytable rows with sets as sorted lists """
+        with tempfile.TemporaryDirectory() as tmp:
+            db_file = os.path.join(tmp, 'Homework11.db')
+            load_database(DATA_DIR, db_file)
+            pool = ConnectionPool(db_file)
+            stevens = University(DATA_DIR, pool=pool)
+            students_file, instructors_file, majors_file = stevens.export_summary(tmp, batch_size=3)
+            with open(students_file, newline='') as fp:
+                rows = list(csv.reader(fp))
+            self.assertEqual(rows[0], Student.pt_header(None))
+            self.assertEqual(len(rows), 11)
+            self.assertIn(['10103', 'Baldwin, C', 'SFEN', '["CS 501", "SSW 564", "SSW 567", "SSW 687"]', '["SSW 540", "SSW 555"]', ''], rows)
+            self.assertEqual({row[0]: row[3:] for row in rows[1:]},
+                             {cwid: [json.dumps(sorted(completed)), json.dumps(sorted(required)), '' if electives is None else json.dumps(sorted(electives))]
+                              for cwid, name, major_name, completed, required, electives in stevens.student_rows()})
+            with open(instructors_file, newline='') as fp:
+                self.assertEqual(len(list(csv.reader(fp))), len(stevens.instructor_prettytable().rows) + 1)
+
+            try:
+                import pyarrow.parquet
+            except ImportError:
+                pool.close()
+                return
+            stevens.export_summary(tmp, 'parquet', batch_size=3)
+            table = pyarrow.parquet.read_table(os.path.join(tmp, 'students.parquet'))
+            self.assertEqual(table.num_rows, 10)
+            self.assertEqual(table.column('Remaining Required').to_pylist()[0], ['SSW 540', 'SSW 555'])
+            stevens.export_summary(tmp, 'arrow')
+            with pyarrow.ipc.open_file(os.path.join(tmp, 'majors.arrow')) as reader:
+                self.assertEqual(reader.read_all().column('Major').to_pylist(), list(stevens._majors))
+            pool.close()
+
+    def test_indexes(self):
+        """ Tests that the index lookups return the students a scan finds, in every way of importing """
+        stevens = University(DATA_DIR, course_index=True)
+        self.assertEqual(list(stevens.course_students('SSW 567')), ['10103', '10115', '10172', '10175'])
+        self.assertEqual(set(stevens.major_students('SYEN')), {cwid for cwid, student in stevens.students.items() if student.major_name == 'SYEN'})
+        self.assertEqual(list(stevens.taught_students('98760', 'SYS 611')), ['11461', '11714'])
+        self.assertEqual(list(stevens.course_students('CS 999')), [])
+        stevens.add_grades([('10103', 'SSW 567', 'B', '98765')]) # taking a course again doesn't list the student twice
+        self.assertEqual(list(stevens.taught_students('98765', 'SSW 567')), ['10103', '10115', '10172', '10175'])
+        self.assertEqual(len(stevens._taught['SSW 567']['98765']), 4)
+        scanned = University(DATA_DIR) # without course_index
+        self.assertIsNone(scanned._taught)
+        self.assertEqual(sorted(scanned.course_students('SSW 567')), ['10103', '10115', '10172', '10175'])
+        with self.assertRaises(ValueError):
+            scanned.taught_students('98765', 'SSW 567')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in DATA_FILES:
+                shutil.copy(os.path.join(DATA_DIR, name), tmp)
+            stevens = University(tmp, course_index=True)
+            for other in (University(tmp, compact=True, course_index=True), University(tmp, workers=2, course_index=True),
+                          University(tmp, snapshot=True, course_index=True), University(tmp, snapshot=True, course_index=True)):
+                for course, instructors in stevens._taught.items():
+                    self.assertEqual(list(other.course_students(course)), list(stevens.course_students(course)))
+                    for instructor_cwid in instructors:
+                        self.assertEqual(list(other.taught_students(instructor_cwid, course)), list(stevens.taught_students(instructor_cwid, course)))
+                for major in stevens._majors:
+                    self.assertEqual(list(other.major_students(major)), list(stevens.major_students(major)))
+
+        stevens.add_students([('10103', 'Baldwin, C', 'SYEN')]) # moves the student to SYEN
+        self.assertIn('10103', stevens.major_students('SYEN'))
+        self.assertNotIn('10103', stevens.major_students('SFEN'))
+
+    def test_refresh(self):
+        """ Tests that refresh imports only the appended lines and reloads a rewritten file """
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in DATA_FILES:
+                shutil.copy(os.path.join(DATA_DIR, name), tmp)
+            stevens = University(tmp)
+            self.assertEqual(stevens.refresh(), (set(), set()))
+
+            with open(os.path.join(tmp, 'students.txt'), 'a') as fp:
+                fp.write('12000\tNew, S\tSFEN\n')
+            with open(os.path.join(tmp, 'grades.txt'), 'a') as fp:
+                fp.write('12000\tSSW 540\tA\t98765\n10103\tSSW 540\tB\t98765\n12000\tSSW 555') # the last line isn't finished yet
+            self.assertEqual(stevens.refresh(), ({'12000', '10103'}, {'98765'}))
+            self.assertEqual(stevens.students['12000'].courses, {'SSW 540': 'A'})
+            self.assertEqual(stevens.instructors['98765'].courses['SSW 540'], 5)
+
+            with open(os.path.join(tmp, 'grades.txt'), 'a') as fp:
+                fp.write('\tA\t98763\n')
+            self.assertEqual(stevens.refresh(), ({'12000'}, {'98763'}))
+            self.assertEqual(stevens.students['12000'].courses, {'SSW 540': 'A', 'SSW 555': 'A'})
+
+            compact = University(tmp, compact=True)
+            with open(os.path.join(tmp, 'students.txt'), 'a') as fp: # listed again, the courses and counts stay as in a full load
+                fp.write('10103\tBaldwin, C\tSYEN\n')
+            with open(os.path.join(tmp, 'instructors.txt'), 'a') as fp:
+                fp.write('98765\tEinstein, A\tSYEN\n')
+            self.assertEqual(stevens.refresh(), ({'10103'}, {'98765'}))
+            self.assertEqual(compact.refresh(), ({'10103'}, {'98765'}))
+            reloaded = University(tmp)
+            for university in (stevens, compact):
+                self.assertEqual([student.pt_row() for student in university.students.values()], [student.pt_row() for student in reloaded.students.values()])
+                self.assertEqual(university.instructors['98765'].courses, reloaded.instructors['98765'].courses)
+                self.assertEqual(university.instructors['98765'].department, 'SYEN')
+                self.assertEqual(sorted(university.major_students('SYEN')), sorted(reloaded.major_students('SYEN')))
+
+            with open(os.path.join(tmp, 'grades.txt'), 'w') as fp:
+                fp.write('10103\tSSW 540\tA\t98765\n')
+            students, instructors = stevens.refresh()
+            self.assertEqual(students, set(stevens.students))
+            self.assertEqual(stevens.students['10103'].courses, {'SSW 540': 'A'})
+            self.assertEqual(stevens.instructors['98765'].courses, {'SSW 540': 1})
+
+            # the import stops at a bad line, a refresh doesn't import the lines appended after it either
+            for workers in (None, 2):
+                with open(os.path.join(tmp, 'grades.txt'), 'w') as fp:
+                    fp.write('10103\tSSW 540\tA\t98765\n10103\tSSW 564\n10103\tSSW 567\tA\t98765\n')
+                stevens = University(tmp, workers=workers)
+                with open(os.path.join(tmp, 'grades.txt'), 'a') as fp:
+                    fp.write('10103\tSSW 555\tA\t98765\n')
+                stevens.refresh()
+                reloaded = University(tmp)
+                self.assertEqual(stevens.students['10103'].courses, reloaded.students['10103'].courses)
+                self.assertEqual(stevens.students['10103'].courses, {'SSW 540': 'A'})
+
+    def test_live_summary(self):
+        """ Tests that polling updates only the rows of the students and instructors in the new lines,
+            and that watch reports a change well within a second """
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in DATA_FILES:
+                shutil.copy(os.path.join(DATA_DIR, name), tmp)
+            stevens = University(tmp)
+            live = LiveSummary(stevens, interval=0.01)
+            self.assertEqual(list(live.student_rows()), list(stevens.student_rows()))
+            self.assertEqual(list(live.instructor_rows()), [[instructor.cwid, instructor.name, instructor.department, course, count]
+                                                            for instructor in stevens.instructors.values() for course, count in instructor.courses.items()])
+            self.assertEqual(live.poll(), (set(), set()))
+
+            untouched = live.students['10115']
+            with open(os.path.join(tmp, 'grades.txt'), 'a') as fp:
+                fp.write('10103\tSSW 540\tA\t98765\n')
+            self.assertEqual(live.poll(), ({'10103'}, {'98765'}))
+            self.assertIn('SSW 540', live.students['10103'][3])
+            self.assertIs(live.students['10115'], untouched)
+            self.assertIn(['98765', 'Einstein, A', 'SFEN', 'SSW 540', 4], live.instructors['98765'])
+
+            updates = []
+            done = threading.Event()
+            stop = threading.Event()
+            thread = threading.Thread(target=live.watch, args=(lambda students, instructors: (updates.append(students), done.set()), stop))
+            thread.start()
+            try:
+                with open(os.path.join(tmp, 'students.txt'), 'a') as fp:
+                    fp.write('12000\tNew, S\tSYEN\n')
+                self.assertTrue(done.wait(1.0))
+            finally:
+                stop.set()
+                thread.join()
+            self.assertEqual(updates, [{'12000'}])
+            self.assertEqual(live.students['12000'][:3], ['12000', 'New, S', 'SYEN'])
+
+            with open(os.path.join(tmp, 'students.txt'), 'w') as fp: # rewritten, everything is imported again
+                fp.write('10103\tBaldwin, C\tSFEN\n')
+            live.poll()
+            self.assertEqual(list(live.students), ['10103'])
+            self.assertEqual(list(live.student_rows()), list(stevens.student_rows()))
+
+    def test_snapshot(self):
+        """ Tests that a snapshot gives back the same university and is ignored once a data file changes """
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in DATA_FILES:
+                shutil.copy(os.path.join(DATA_DIR, name), tmp)
+            for compact in (False, True):
+                parsed = University(tmp, compact=compact, snapshot=True)
+                self.assertTrue(os.path.exists(os.path.join(tmp, SNAPSHOT_FILE)))
+                loaded = University(tmp, compact=compact, snapshot=True)
+                self.assertTrue(loaded.load_snapshot(os.path.join(tmp, SNAPSHOT_FILE), snapshot_key(tmp, compact)))
+                for cwid, student in parsed.students.items():
+                    self.assertEqual(loaded.students[cwid].pt_row(), student.pt_row())
+                for cwid, instructor in parsed.instructors.items():
+                    self.assertEqual(loaded.instructors[cwid].courses, instructor.courses)
+
+            with open(os.path.join(tmp, 'grades.txt'), 'a') as fp:
+                fp.write('10103\tSSW 540\tA\t98765\n')
+            self.assertFalse(loaded.load_snapshot(os.path.join(tmp, SNAPSHOT_FILE), snapshot_key(tmp, True)))
+            self.assertEqual(University(tmp, snapshot=True).students['10103'].courses['SSW 540'], 'A')
+
+    def test_connection_pool(self):
+        """ Tests that each thread gets its own WAL mode connection and that University reads the instructor summary through the pool """
+        with tempfile.TemporaryDirectory() as tmp:
+            db_file = os.path.join(tmp, 'Homework11.db')
+            shutil.copy(DB_FILE, db_file)
+            pool = ConnectionPool(db_file)
+            self.assertIs(pool.connection(), pool.connection())
+            self.assertEqual(pool.execute('PRAGMA journal_mode'), [('wal',)])
+            connections = []
+            thread = threading.Thread(target=lambda: connections.append(pool.connection()))
+            thread.start()
+            thread.join()
+            self.assertIsNot(connections[0], pool.connection())
+
+            stevens = University(DATA_DIR, pool=pool)
+            self.assertEqual(len(stevens.instructor_prettytable().rows), len(Instructor.pt_row(pool)))
+            pool.close()
+
+    def test_schema(self):
+        """ Tests that create_schema adds primary keys to an old database and that the instructor summary counts per instructor and course from the index """
+        connection = sqlite3.connect(':memory:', isolation_level=None)
+        connection.execute('create table HW11_instructors (CWID TEXT, Name TEXT, Dept TEXT)')
+        connection.executemany('insert into HW11_instructors values (?, ?, ?)', [('98765', 'Einstein, A', 'SFEN'), ('98764', 'Feynman, R', 'SFEN')])
+        create_schema(connection)
+        self.assertEqual([column[5] for column in connection.execute('PRAGMA table_info(HW11_instructors)')], [1, 0, 0])
+        self.assertEqual(len(connection.execute('select * from HW11_instructors').fetchall()), 2)
+
+        connection.executemany('insert into HW11_grades values (?, ?, ?, ?)', [('10103', 'SSW 567', 'A', '98765'), ('10115', 'SSW 567', 'A', '98765'),
+                                                                                ('10103', 'SSW 567', 'B', '98764'), ('10103', 'SSW 564', 'A', '98764')])
+        self.assertEqual(sorted(connection.execute(INSTRUCTOR_SUMMARY)), [('98764', 'Feynman, R', 'SFEN', 'SSW 564', 1),
+                                                                          ('98764', 'Feynman, R', 'SFEN', 'SSW 567', 1),
+                                                                          ('98765', 'Einstein, A', 'SFEN', 'SSW 567', 2)])
+        plan = [row[3] for row in connection.execute('explain query plan ' + INSTRUCTOR_SUMMARY)]
+        self.assertFalse([step for step in plan if 'HW11_grades' in step or 'TEMP B-TREE' in step])
+        plan = [row[3] for row in connection.execute('explain query plan ' + COUNT_INSTRUCTOR_COURSES)]
+        self.assertEqual(plan, ['SCAN HW11_grades USING COVERING INDEX HW11_grades_instructor_course'])
+
+    def test_instructor_course_counts(self):
+        """ Tests that the triggers keep HW11_instructor_courses equal to counting the grades """
+        connection = sqlite3.connect(':memory:', isolation_level=None)
+        connection.execute('create table HW11_grades (Student_CWID TEXT, Course TEXT, Grade TEXT, Instructor_CWID TEXT)')
+        connection.execute("insert into HW11_grades values ('10103', 'SSW 567', 'A', '98765')")
+        create_schema(connection) # counts the grade that is already there
+        connection.executemany('insert into HW11_grades values (?, ?, ?, ?)', [('10115', 'SSW 567', 'A', '98765'), ('10172', 'SSW 564', 'A', '98764')])
+        connection.execute("update HW11_grades set Instructor_CWID = '98764' where Student_CWID = '10115'")
+        connection.execute("delete from HW11_grades where Student_CWID = '10172'")
+        counts = 'select Instructor_CWID, Course, {} from {} group by Instructor_CWID, Course order by 1, 2'
+        self.assertEqual(connection.execute(counts.format('Students', 'HW11_instructor_courses')).fetchall(),
+                         connection.execute(counts.format('count(*)', 'HW11_grades')).fetchall())
+        self.assertEqual(connection.execute(counts.format('Students', 'HW11_instructor_courses')).fetchall(),
+                         [('98764', 'SSW 567', 1), ('98765', 'SSW 567', 1)])
+
+    def test_load_database(self):
+        """ Tests that load_database copies the .txt files into the tables and that the instructor summary then matches the imported instructors """
+        with tempfile.TemporaryDirectory() as tmp:
+            db_file = os.path.join(tmp, 'Homework11.db')
+            shutil.copy(DB_FILE, db_file)
+            rows = load_database(DATA_DIR, db_file, transaction_rows=5)
+            self.assertEqual(rows, {'HW11_majors': 13, 'HW11_students': 10, 'HW11_instructors': 6, 'HW11_grades': 22})
+
+            pool = ConnectionPool(db_file)
+            self.assertEqual(pool.execute("select Flag, Course from HW11_majors where Major = 'SYEN' order by rowid")[:2], [('R', 'SYS 671'), ('R', 'SYS 612')])
+            self.assertIn(('index', 'HW11_grades_student_course'), pool.execute('select type, name from sqlite_master'))
+            stevens = University(DATA_DIR, pool=pool)
+            summary = {(cwid, course): students for cwid, name, department, course, students in Instructor.pt_row(pool)}
+            self.assertEqual(summary, {(cwid, course): students for cwid, instructor in stevens.instructors.items() for course, students in instructor.courses.items()})
+            pool.close()
+
+    def test_service(self):
+        """ Tests the answers of the query service to a client over a socket """
+        async def ask(port, lines):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            answers = []
+            for line in lines:
+                writer.write(line.encode() + b'\n')
+                answers.append(json.loads(await reader.readline()))
+            writer.close()
+            return answers
+
+        async def run(service):
+            server = await service.start(port=0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                return await asyncio.gather(ask(port, ['student 10103', 'instructor 98760']), ask(port, ['student 1', 'grades 10103']))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            db_file = os.path.join(tmp, 'Homework11.db')
+            load_database(DATA_DIR, db_file)
+            pool = ConnectionPool(db_file)
+            service = UniversityService(University(DATA_DIR, pool=pool), max_pending=1)
+            (student, instructor), (unknown, bad) = asyncio.run(run(service))
+            service.close()
+            lazy = UniversityService(University(DATA_DIR, pool=pool, lazy=True, shards=4)) # the clients arrive while the files are imported in a thread
+            self.assertEqual(asyncio.run(run(lazy)), [[student, instructor], [unknown, bad]])
+            self.assertEqual(lazy.university._grade_shards, {grade_shard('10103', 4)})
+            self.assertFalse(lazy.university._grades_loaded)
+            lazy.close()
+            pool.close()
+        self.assertEqual(student, {'cwid': '10103', 'name': 'Baldwin, C', 'major': 'SFEN', 'completed': ['CS 501', 'SSW 564', 'SSW 567', 'SSW 687'],
+                                   'remaining_required': ['SSW 540', 'SSW 555'], 'remaining_electives': None})
+        self.assertEqual(sorted(instructor['courses']), [['SYS 611', 2], ['SYS 645', 1], ['SYS 750', 1], ['SYS 800', 1]])
+        self.assertEqual(unknown, {'error': 'unknown student 1'})
+        self.assertEqual(bad, {'error': 'unknown request grades'})
+
+    def test_remaining_cache(self):
+        """ Tests that cached remaining courses are reused until the student's or the major's courses change """
+        stevens = University(DATA_DIR)
+        student = stevens.students['10103']
+        self.assertEqual(student.pt_row(), student.pt_row())
+        self.assertEqual(stevens.remaining_cache.stats(), {'hits': 1, 'misses': 1, 'size': 1, 'maxsize': None})
+
+        student.add_course('SSW 540', 'A')
+        self.assertEqual(student.remaining()[1], {'SSW 555'})
+        student.major.add_course('R', 'SSW 800')
+        self.assertEqual(student.remaining()[1], {'SSW 555', 'SSW 800'})
+        self.assertEqual((stevens.remaining_cache.hits, stevens.remaining_cache.misses), (1, 3))
+
+        cache = RemainingCache(maxsize=2)
+        major = Major('SFEN', cache=cache)
+        students = [Student(cwid, 'Name', 'SFEN', major) for cwid in ('1', '2', '3')]
+        for student in students + students[2:]:
+            student.remaining()
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 3, 'size': 2, 'maxsize': 2})
+        self.assertNotIn('1', cache._results)
+
+    def test_instrumentation(self):
+        """ Tests that the instruments time the phases of loading and reporting and count their rows """
+        instruments = Instrumentation(profile=True, trace_memory=True)
+        stevens = University(DATA_DIR, instruments=instruments)
+        stevens.student_prettytable()
+        with instruments.phase('outer'):
+            with instruments.phase('inner'):
+                data = [0] * 100000
+            del data
+        instruments.close()
+        self.assertFalse(tracemalloc.is_tracing())
+
+        report = instruments.report()
+        phases = report['phases']
+        for name in ('import_majors', 'import_students', 'import_instructors', 'import_grades', 'student remaining', 'student_prettytable'):
+            self.assertEqual(phases[name]['calls'], 1)
+        self.assertEqual(phases['read grades.txt']['rows'], 22)
+        self.assertEqual(phases['student remaining']['rows'], 10)
+        self.assertGreaterEqual(phases['import_grades']['wall'], phases['read grades.txt']['wall'])
+        self.assertGreaterEqual(phases['outer']['peak_bytes'], phases['inner']['peak_bytes'])
+        self.assertGreater(phases['inner']['peak_bytes'], 800000)
+        self.assertTrue(any('remaining' in function['function'] for function in report['profile']))
+        self.assertIn('read grades.txt', instruments.summary())
+        self.assertIsNone(University(DATA_DIR).instruments)
+
+    def test_lazy_university(self):
+        """ Tests that the lazy mode imports each file when it's needed and ends up with the same data """
+        stevens = University(DATA_DIR)
+        for compact in (False, True):
+            lazy = University(DATA_DIR, compact=compact, lazy=True, shards=4)
+            self.assertEqual(str(lazy.major_prettytable()), str(stevens.major_prettytable()))
+            self.assertNotIn('students', lazy.__dict__)
+            self.assertEqual(lazy._files, {os.path.join(DATA_DIR, 'majors.txt'): stevens._files[os.path.join(DATA_DIR, 'majors.txt')]})
+
+            self.assertEqual(dict(lazy.student('10103').courses), stevens.students['10103'].courses)
+            other = [cwid for cwid in stevens.students if grade_shard(cwid, 4) != grade_shard('10103', 4)][0]
+            self.assertEqual(dict(lazy.students[other].courses), {}) # its shard isn't imported yet
+            self.assertEqual(lazy.instructors['98765'].courses, {})
+
+            self.assertEqual(str(lazy.student_prettytable()), str(stevens.student_prettytable()))
+            self.assertEqual(lazy._files, stevens._files)
+            self.assertEqual(lazy.instructors['98765'].courses, stevens.instructors['98765'].courses)
+            if compact:
+                self.assertEqual(len(lazy._enrollments), 22) # the grades of the first shard aren't kept twice
+            self.assertEqual(list(lazy.course_students('SSW 567')), list(stevens.course_students('SSW 567')))
+            self.assertIsNone(lazy.student('1'))
+            with self.assertRaises(AttributeError):
+                lazy.grades
+
+    def test_sharded_university(self):
+        """ Tests that a university split over two directories reports the same as one directory with all the data """
+        stevens = University(DATA_DIR)
+        with open(os.path.join(DATA_DIR, 'grades.txt')) as fp:
+            grades = fp.readlines()
+        with tempfile.TemporaryDirectory() as tmp:
+            dir_paths = [os.path.join(tmp, term) for term in ('fall', 'spring')]
+            for number, dir_path in enumerate(dir_paths):
+                os.mkdir(dir_path)
+                for name in ('majors.txt', 'students.txt', 'instructors.txt'):
+                    shutil.copy(os.path.join(DATA_DIR, name), dir_path)
+                with open(os.path.join(dir_path, 'grades.txt'), 'w') as fp:
+                    fp.writelines(grades[number::2]) # every student and instructor has grades in both terms
+            with open(os.path.join(dir_paths[0], 'grades.txt'), 'a') as fp:
+                fp.write('bad line\n')
+            for processes in (None, 2):
+                sharded = ShardedUniversity(dir_paths, processes=processes, cache_size=4, quarantine=QUARANTINE_FILE, course_index=True)
+                self.assertEqual([shard.quarantine.counts for shard in sharded.universities], [{('grades.txt', 'wrong number of fields'): 1}, {}])
+                with open(os.path.join(dir_paths[0], QUARANTINE_FILE)) as fp:
+                    self.assertEqual(fp.read(), 'grades.txt\t12\twrong number of fields: 1\tbad line\n')
+                self.assertEqual([shard.remaining_cache.maxsize for shard in sharded.universities], [4, 4])
+                self.assertEqual(len(sharded.students), 10)
+                self.assertEqual(list(sharded.student_rows()), list(stevens.student_rows())) # the same sets, maybe printed in another order
+                self.assertEqual(len(sharded.student_prettytable().rows), 10)
+                self.assertEqual([major.pt_row() for major in sharded._majors.values()], [major.pt_row() for major in stevens._majors.values()])
+                self.assertEqual(sorted(map(tuple, sharded.instructor_rows())),
+                                 sorted((cwid, instructor.name, instructor.department, course, students)
+                                        for cwid, instructor in stevens.instructors.items() for course, students in instructor.courses.items()))
+                self.assertEqual(sharded.instructors['98760'].courses, stevens.instructors['98760'].courses)
+                self.assertEqual(sorted(sharded.course_students('SSW 567')), sorted(stevens.course_students('SSW 567')))
+                self.assertIs(sharded.students['10103'].major, sharded._majors['SFEN'])
+                self.assertNotIn('1', sharded.students)
+                self.assertEqual(sorted(sharded.taught_students('98765', 'SSW 567')), sorted(stevens.course_students('SSW 567')))
+                with self.assertRaises(TypeError):
+                    sharded.state()
+
+            live = LiveSummary(sharded, interval=0.01)
+            self.assertEqual(sorted(live.student_rows()), sorted(sharded.student_rows()))
+            with open(os.path.join(dir_paths[1], 'grades.txt'), 'a') as fp:
+                fp.write('10103\tSSW 540\tA\t98765\n')
+            self.assertEqual(live.poll(), ({'10103'}, {'98765'}))
+            self.assertEqual(live.students['10103'][4], {'SSW 555'})
+            with open(os.path.join(dir_paths[1], 'grades.txt'), 'w') as fp: # rewritten, the shard imports it again
+                fp.writelines(grades[1::2])
+            live.poll()
+            self.assertEqual(sorted(live.student_rows()), sorted(stevens.student_rows()))
+            with open(os.path.join(dir_paths[1], 'majors.txt'), 'a') as fp: # SFEN needs another course in one shard only
+                fp.write('SFEN\tR\tSSW 999\n')
+            live.poll()
+            self.assertIn('SSW 999', sharded._majors['SFEN'].pt_row()[1])
+            self.assertIn('SSW 999', live.students['10103'][4])
+            self.assertIn('SSW 999', next(row for row in sharded.student_rows() if row[0] == '10175')[4])
+            with self.assertRaises(ValueError):
+                ShardedUniversity(dir_paths, lazy=True)
+
+    def test_sql_university(self):
+        """ Tests that the SQL engine makes the same summaries as the text engine from the same data """
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in DATA_FILES:
+                shutil.copy(os.path.join(DATA_DIR, name), tmp)
+            with open(os.path.join(tmp, 'grades.txt'), 'a') as fp:
+                fp.write('10103\tSSW 564\tF\t98764\n10115\tCS 545\tA\t98764\n') # fails a passed course again, passes an elective
+            db_file = os.path.join(tmp, 'Homework11.db')
+            load_database(tmp, db_file)
+            os.mkdir(os.path.join(tmp, 'sql'))
+            os.mkdir(os.path.join(tmp, 'text'))
+            text = open_university(tmp, 'text', db_file)
+            sql = open_university(tmp, 'sql', db_file, page_size=3)
+            self.assertEqual(list(sql.student_rows()), list(text.student_rows()))
+            self.assertEqual(dict(sql.iter_remaining()), text.remaining_all())
+            self.assertEqual(list(sql.major_rows()), [major.pt_row() for major in text._majors.values()])
+            self.assertEqual(str(sql.instructor_prettytable()), str(text.instructor_prettytable()))
+            for sql_file, text_file in zip(sql.export_summary(os.path.join(tmp, 'sql')), text.export_summary(os.path.join(tmp, 'text'))):
+                with open(sql_file) as sql_fp, open(text_file) as text_fp:
+                    self.assertEqual(sql_fp.read(), text_fp.read(), os.path.basename(sql_file))
+            sql_instruments = Instrumentation()
+            SQLUniversity(sql.pool, instruments=sql_instruments).write_student_summary(io.StringIO())
+            self.assertEqual(sql_instruments.report()['phases']['write_student_summary']['rows'], len(text.students))
+            for name in ('students', 'student', 'refresh', 'course_students', 'major_students', 'taught_students', 'load'):
+                self.assertFalse(hasattr(sql, name), name) # the in-memory lookups aren't inherited
+            with self.assertRaises(TypeError):
+                UniversityService(sql)
+            with self.assertRaises(TypeError):
+                LiveSummary(sql)
+            plan = ' '.join(row[3] for row in sql.pool.execute('explain query plan ' + STUDENT_SUMMARY.replace('{passing}', "'A'")))
+            self.assertNotIn('SCAN G', plan)
+            self.assertNotIn('SCAN M', plan)
+            text.pool.close()
+            sql.pool.close()
+        with self.assertRaises(ValueError):
+            open_university(DATA_DIR, 'csv')
+
+    def test_grade_stats(self):
+        """ Tests the GPA, pass/fail and distribution columns against the grades in the files, in every engine """
+        stats = University(DATA_DIR).grade_stats()
+        row = stats.cwids.index('10103') # A A- B B, all passing
+        self.assertEqual((stats.majors[row], stats.gpa[row], stats.credits[row], stats.passed[row], stats.failed[row]),
+                         ('SFEN', (4.0 + 3.75 + 3.0 + 3.0) / 4, 4, 4, 0))
+        row = stats.cwids.index('11658') # F
+        self.assertEqual((stats.gpa[row], stats.credits[row], stats.passed[row], stats.failed[row]), (0.0, 1, 0, 1))
+        self.assertEqual(stats.distribution('SSW 540'), {'A': 1, 'B': 1, 'F': 1})
+        majors = stats.by_major()
+        self.assertEqual(sorted(majors), ['SFEN', 'SYEN'])
+        self.assertEqual(majors['SYEN'][0], 5)
+        self.assertEqual(majors['SYEN'][2:], (7, 1))
+        self.assertAlmostEqual(majors['SFEN'][1], sum(stats.points[:5]) / sum(stats.credits[:5]))
+
+        columns = lambda stats: list(zip(stats.cwids, stats.majors, stats.gpa, stats.credits, stats.passed, stats.failed))
+        compact = University(DATA_DIR, compact=True).grade_stats()
+        self.assertEqual(columns(compact), columns(stats))
+        self.assertEqual(compact.distributions(), stats.distributions())
+        with tempfile.TemporaryDirectory() as tmp:
+            db_file = os.path.join(tmp, 'Homework11.db')
+            load_database(DATA_DIR, db_file)
+            sql = open_university(DATA_DIR, 'sql', db_file)
+            self.assertEqual(columns(sql.grade_stats()), columns(stats))
+            self.assertEqual(sql.grade_stats().distributions(), stats.distributions())
+            sql.pool.close()
+
+    def test_quarantine(self):
+        """ Tests that bad lines are quarantined with their line numbers and reasons while the good ones are imported,
+            and that without a quarantine the import stops at the first bad line """
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in DATA_FILES:
+                shutil.copy(os.path.join(DATA_DIR, name), tmp)
+            for name, lines in (('majors.txt', 'SFEN\tX\tSSW 999\n'),
+                                ('students.txt', '20000\tNobody, N\tMATH\n20001\tTwo fields\n20002\tOk, O\tSYEN\n'),
+                                ('grades.txt', '99999\tSSW 540\tA\t98765\n20002\tSSW 540\tA\t11111\nbad line\n20002\tSYS 800\tA\t98760\n')):
+                with open(os.path.join(tmp, name), 'a') as fp:
+                    fp.write(lines)
+            quarantine_file = os.path.join(tmp, QUARANTINE_FILE)
+            stevens = University(tmp, reader=mmap_file_reader, quarantine=quarantine_file)
+            self.assertEqual(stevens.students['20002'].courses, {'SYS 800': 'A'})
+            self.assertNotIn('SSW 999', stevens._majors['SFEN'].pt_row()[2])
+            self.assertEqual(len(stevens.students), 11)
+            with open(quarantine_file) as fp:
+                lines = sorted(line.rstrip('\n').split('\t', 3) for line in fp)
+            self.assertEqual(lines, [['grades.txt', '23', 'unknown student: 99999', '99999\tSSW 540\tA\t98765'],
+                                     ['grades.txt', '24', 'unknown instructor: 11111', '20002\tSSW 540\tA\t11111'],
+                                     ['grades.txt', '25', 'wrong number of fields: 1', 'bad line'],
+                                     ['majors.txt', '14', 'invalid flag: X', 'SFEN\tX\tSSW 999'],
+                                     ['students.txt', '11', 'unknown major: MATH', '20000\tNobody, N\tMATH'],
+                                     ['students.txt', '12', 'wrong number of fields: 2', '20001\tTwo fields']])
+            self.assertEqual(len(stevens.quarantine), 6)
+            self.assertEqual(stevens.quarantine.counts['students.txt', 'unknown major'], 1)
+
+            with open(os.path.join(tmp, 'grades.txt'), 'a') as fp:
+                fp.write('x\n20002\tSYS 612\tA\t98760\n')
+            self.assertEqual(stevens.refresh(), ({'20002'}, {'98760'}))
+            self.assertEqual(stevens.students['20002'].courses, {'SYS 800': 'A', 'SYS 612': 'A'})
+            self.assertEqual(stevens.quarantine.counts['grades.txt', 'wrong number of fields'], 2)
+            stevens.load(tmp) # starts the quarantine over
+            self.assertEqual(len(stevens.quarantine), 7)
+            University(tmp, quarantine=quarantine_file, snapshot=True)
+            warm = University(tmp, quarantine=quarantine_file, snapshot=True) # parses nothing and keeps the quarantine file
+            self.assertEqual(warm.quarantine.counts, stevens.quarantine.counts)
+            with open(quarantine_file) as fp:
+                self.assertEqual(len(fp.readlines()), 7)
+            self.assertEqual(University(tmp, quarantine=quarantine_file, lazy=True).student('20002').courses, {'SYS 800': 'A', 'SYS 612': 'A'})
+
+            stevens = University(tmp) # the import of a file stops at its first bad line, an unknown major included
+            self.assertEqual(len(stevens.students), 10)
+            self.assertEqual(len(University(tmp, snapshot=True).students), 10) # not the snapshot taken with the quarantine
+            self.assertEqual(len(University(tmp, snapshot=True, quarantine=quarantine_file).students), 11)
+            self.assertEqual(stevens._files[os.path.join(tmp, 'students.txt')][1], 10)
+
+    def test_parallel_import(self):
+        """ Tests that importing the grades in worker processes gives the same students and instructors as one process """
+        stevens = University(DATA_DIR)
+        parallel = University(DATA_DIR, workers=2)
+        for cwid, student in stevens.students.items():
+            self.assertEqual(list(parallel.students[cwid].courses.items()), list(student.courses.items()))
+        for cwid, instructor in stevens.instructors.items():
+            self.assertEqual(list(parallel.instructors[cwid].courses.items()), list(instructor.courses.items()))
+        self.assertEqual(line_chunks(os.path.join(DATA_DIR, 'grades.txt'), 1000)[-1][1], os.path.getsize(os.path.join(DATA_DIR, 'grades.txt')))
+
+        with tempfile.TemporaryDirectory() as tmp: # a grade of an unknown student stops the import at its line, like in one process
+            for name in DATA_FILES:
+                shutil.copy(os.path.join(DATA_DIR, name), tmp)
+            with open(os.path.join(tmp, 'grades.txt'), 'a') as fp:
+                fp.write('99999\tSSW 540\tA\t98765\n10103\tSSW 540\tA\t98765\n')
+            parallel = University(tmp, workers=2)
+            self.assertEqual(parallel.students['10103'].courses, stevens.students['10103'].courses)
+            self.assertEqual(parallel._files, University(tmp)._files)
+
 
 if __name__ == '__main__':
-    unittest.main(exit = False, verbosity = 2)
-    main()
+    parser = argparse.ArgumentParser(description="print the student, instructor and major summaries")
+    parser.add_argument('--summary', action='append', choices=SUMMARIES, help="print only this summary, may be repeated, skips the tests")
+    parser.add_argument('--lazy', action='store_true', help="import only the files the summaries need")
+    args, rest = parser.parse_known_args()
+    if args.summary is None:
+        unittest.main(argv=sys.argv[:1] + rest, exit = False, verbosity = 2)
+    # HW11_INSTRUMENT=1 prints the timing summary too, =profile adds cProfile and =memory measures memory with tracemalloc
+    instrument = os.environ.get('HW11_INSTRUMENT')
+    instruments = Instrumentation(profile=instrument == 'profile', trace_memory=instrument == 'memory') if instrument else None
+    main(instruments, summaries=args.summary or SUMMARIES, lazy=args.lazy)
+    if instruments is not None:
+        instruments.close()
     
@@ -0,0 +1,680 @@
+""" Benchmarks for the HW11 University code.
+
+    python benchmarks.py readers --size 5G      compare file_reader, file_reader_batches and mmap_file_reader
+    python benchmarks.py memory --students 100000     bytes per enrollment with and without University(compact=True)
+    python benchmarks.py snapshot --students 100000   cold and warm start of University(snapshot=True)
+    python benchmarks.py instructor-sql --rows 10M    the instructor summary query without indexes, with them and from the materialized counts
+    python benchmarks.py load-db --students 5000000   rows per second of load_database into a new Homework11.db
+    python benchmarks.py report --students 100000     time and peak memory of the student summary as a PrettyTable and streamed
+    python benchmarks.py export --students 1000000    time University.export_summary in each format
+    python benchmarks.py service --clients 200        p50 and p99 latency of UniversityService under concurrent clients
+    python benchmarks.py sharded --shards 4 --students 100000   ShardedUniversity in threads and in processes
+    python benchmarks.py grades --students 1000000    time grade_stats and its per-major and per-course aggregates
+    python benchmarks.py parallel --workers 1,2,4,8   load time and the parent's merge time of University(workers=n)
+    python benchmarks.py watch --students 1000000     latency from appending grades to the updated rows of a LiveSummary
+    python benchmarks.py symbols --students 200000    memory of a University with a copy per row, a table per file and one symbol table
+    python benchmarks.py suite --scales 1K,10K,100K --out results.json [--compare old.json]
+                                                     time loading and every summary at each scale, save the results as JSON
+"""
+import argparse
+import asyncio
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import resource
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import HW11_V3_Sarita_Hedaya as hw11
+
+GRADES = ['A', 'A-', 'B+', 'B', 'B-', 'C+', 'C', 'D', 'F']
+
+
+def parse_size(text):
+    """ turn '5G', '200M', '64K' or '1000' into a number of bytes """
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    if text[-1].upper() in units:
+        return int(float(text[:-1]) * units[text[-1].upper()])
+    return int(text)
+
+
+def parse_count(text):
+    """ turn '10M', '100K' or '1000' into a number, K and M are powers of ten """
+    units = {'K': 10 ** 3, 'M': 10 ** 6}
+    if text[-1].upper() in units:
+        return int(float(text[:-1]) * units[text[-1].upper()])
+    return int(text)
+
+
+def write_grades(file_name, size, students=1000000, courses=400, instructors=2000, seed=810):
+    """ write a synthetic tab separated grades file of about size bytes, return the number of lines """
+    rng = random.Random(seed)
+    course_names = [f"SSW {500 + i}" for i in range(courses)]
+    lines = 0
+    written = 0
+    with open(file_name, 'w') as fp:
+        while written < size:
+            block = ''.join(f"{10000 + rng.randrange(students)}\t{rng.choice(course_names)}\t{rng.choice(GRADES)}\t{90000 + rng.randrange(instructors)}\n"
+                            for _ in range(10000))
+            fp.write(block)
+            written += len(block)
+            lines += 10000
+    return lines
+
+
+def write_university(dir_path, students, courses_per_student=10, instructors=None, majors=8, seed=810):
+    """ write students.txt, instructors.txt, majors.txt and grades.txt for a synthetic university to dir_path,
+        return the number of grades
+    """
+    rng = random.Random(seed)
+    instructors = instructors or max(10, students // 50)
+    major_names = [f"M{i:03}" for i in range(majors)]
+    catalog = [f"SSW {500 + i}" for i in range(40 * majors)]
+    with open(os.path.join(dir_path, 'majors.txt'), 'w') as fp:
+        for i, major in enumerate(major_names):
+            courses = catalog[i * 40:(i + 1) * 40]
+            for course in courses[:6]:
+                fp.write(f"{major}\tR\t{course}\n")
+            for course in rng.sample(catalog, 6):
+                fp.write(f"{major}\tE\t{course}\n")
+    instructor_cwids = [str(90000 + i) for i in range(instructors)] # instructor i teaches in major i % majors
+    with open(os.path.join(dir_path, 'instructors.txt'), 'w') as fp:
+        fp.writelines(f"{cwid}\tInstructor, {cwid}\t{major_names[i % majors]}\n" for i, cwid in enumerate(instructor_cwids))
+    grades = 0
+    with open(os.path.join(dir_path, 'students.txt'), 'w') as students_fp, open(os.path.join(dir_path, 'grades.txt'), 'w') as grades_fp:
+        for i in range(students):
+            cwid = str(10000 + i)
+            major = rng.randrange(majors)
+            students_fp.write(f"{cwid}\tStudent, {cwid}\t{major_names[major]}\n")
+            taken = rng.sample(catalog[major * 40:(major + 1) * 40], min(courses_per_student, 40))
+            teachers = instructor_cwids[major::majors]
+            grades_fp.write(''.join(f"{cwid}\t{course}\t{rng.choice(GRADES)}\t{rng.choice(teachers)}\n" for course in taken))
+            grades += len(taken)
+    return grades
+
+
+def _unshared_reader(*args, shared=(), **kwargs):
+    """ file_reader_batches without shared values, every row has its own strings as with file_reader """
+    return hw11.file_reader_batches(*args, **kwargs)
+
+
+def _per_file_reader(file_name, *args, shared=(), values=None, **kwargs):
+    """ file_reader_batches as before University had one Symbols for all the files: a table of shared values for each file
+        and the CWIDs not shared
+    """
+    if os.path.basename(file_name) != 'majors.txt':
+        shared = tuple(column for column in shared if column != 0)
+    return hw11.file_reader_batches(file_name, *args, shared=shared, **kwargs)
+
+
+def bench_symbols(dir_path, students):
+    """ measure the memory of a whole University: with a copy of every value per row, with the values but the CWIDs
+        shared within each file, and with one Symbols for all the files
+    """
+    results = []
+    for mode, reader in (('unshared', _unshared_reader), ('per-file', _per_file_reader), ('symbols', hw11.file_reader_batches)):
+        gc.collect()
+        tracemalloc.start()
+        stevens = hw11.University(dir_path, reader=reader, pool=hw11.ConnectionPool(':memory:'))
+        gc.collect()
+        allocated = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        results.append({'mode': mode, 'bytes': allocated, 'bytes_per_student': allocated / students, 'symbols': len(stevens.symbols.copies)})
+        del stevens
+    return results
+
+
+def bench_memory(dir_path, enrollments):
+    """ measure the bytes that University.import_grades allocates per enrollment: with a copy of every value per row
+        like the original file_reader, in the default storage mode and in the compact storage mode
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as no_grades:
+        for name in ('students.txt', 'instructors.txt', 'majors.txt'):
+            shutil.copy(os.path.join(dir_path, name), no_grades)
+        open(os.path.join(no_grades, 'grades.txt'), 'w').close()
+        for mode, reader, compact in (('unshared', _unshared_reader, False), ('default', hw11.file_reader_batches, False), ('compact', hw11.file_reader_batches, True)):
+            stevens = hw11.University(no_grades, reader=reader, compact=compact)
+            gc.collect()
+            tracemalloc.start()
+            stevens.import_grades(dir_path)
+            allocated = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del stevens
+            results.append({'mode': mode, 'bytes': allocated, 'bytes_per_enrollment': allocated / enrollments})
+    return results
+
+
+def bench_snapshot(dir_path, compact=False):
+    """ time University(snapshot=True) without a snapshot (parse and write it) and with one (load it) """
+    snapshot_file = os.path.join(dir_path, hw11.SNAPSHOT_FILE)
+    if os.path.exists(snapshot_file):
+        os.remove(snapshot_file)
+    results = []
+    for start in ('cold', 'warm'):
+        begin = time.perf_counter()
+        hw11.University(dir_path, compact=compact, snapshot=True)
+        results.append({'start': start, 'seconds': time.perf_counter() - begin})
+    results.append({'start': 'snapshot size', 'bytes': os.path.getsize(snapshot_file)})
+    return results
+
+
+# the instructor summary query before the schema had indexes, it grouped by course only
+LEGACY_INSTRUCTOR_SUMMARY = """
+    select I.CWID, I.Name, I.Dept, G.Course, count(*) as StudentPerClass
+    FROM HW11_instructors I
+    join HW11_grades G
+    on I.CWID = G.Instructor_CWID
+    group by G.Course"""
+
+
+def write_grades_db(db_file, rows, students=1000000, courses=400, instructors=2000, seed=810):
+    """ fill HW11_instructors and HW11_grades of a new database without keys or indexes with synthetic rows """
+    rng = random.Random(seed)
+    course_names = [f"SSW {500 + i}" for i in range(courses)]
+    connection = sqlite3.connect(db_file)
+    connection.execute('PRAGMA journal_mode=OFF')
+    connection.execute('PRAGMA synchronous=OFF')
+    connection.execute('create table HW11_instructors (CWID TEXT, Name TEXT, Dept TEXT)')
+    connection.execute('create table HW11_grades (Student_CWID TEXT, Course TEXT, Grade TEXT, Instructor_CWID TEXT)')
+    connection.executemany('insert into HW11_instructors values (?, ?, ?)', ((str(90000 + i), f"Instructor, {i}", 'SFEN') for i in range(instructors)))
+    def grade():
+        instructor = rng.randrange(instructors) # each instructor teaches four courses
+        return str(10000 + rng.randrange(students)), course_names[(instructor * 4 + rng.randrange(4)) % courses], rng.choice(GRADES), str(90000 + instructor)
+    connection.executemany('insert into HW11_grades values (?, ?, ?, ?)', (grade() for _ in range(rows)))
+    connection.commit()
+    connection.close()
+
+
+def _time_query(db_file, sql):
+    """ run sql on a fresh connection, return (seconds, number of rows, query plan) """
+    connection = sqlite3.connect(db_file)
+    plan = [row[3] for row in connection.execute('explain query plan ' + sql)]
+    start = time.perf_counter()
+    rows = connection.execute(sql).fetchall()
+    seconds = time.perf_counter() - start
+    connection.close()
+    return seconds, len(rows), plan
+
+
+# the instructor summary counted from the grades index, before the counts were kept in HW11_instructor_courses
+INDEXED_INSTRUCTOR_SUMMARY = """
+    select I.CWID, I.Name, I.Dept, G.Course, G.Students
+    from (select Instructor_CWID, Course, count(*) as Students
+          from HW11_grades
+          group by Instructor_CWID, Course) G
+    join HW11_instructors I
+    on I.CWID = G.Instructor_CWID"""
+
+
+def bench_instructor_sql(db_file, inserts=100000):
+    """ time the legacy instructor summary query on the database without keys or indexes, then create_schema, the queries
+        counting from the grades index and reading the materialized counts, and inserting grades with the counting triggers
+    """
+    results = []
+    seconds, rows, plan = _time_query(db_file, LEGACY_INSTRUCTOR_SUMMARY)
+    results.append({'step': 'legacy query, no indexes', 'seconds': seconds, 'rows': rows, 'plan': plan})
+
+    connection = sqlite3.connect(db_file)
+    start = time.perf_counter()
+    hw11.create_schema(connection)
+    results.append({'step': 'create_schema', 'seconds': time.perf_counter() - start, 'rows': 0, 'plan': []})
+
+    for step, sql in (('legacy query', LEGACY_INSTRUCTOR_SUMMARY), ('count from index', INDEXED_INSTRUCTOR_SUMMARY), ('materialized counts', hw11.INSTRUCTOR_SUMMARY)):
+        seconds, rows, plan = _time_query(db_file, sql)
+        results.append({'step': step, 'seconds': seconds, 'rows': rows, 'plan': plan})
+
+    grades = connection.execute('select * from HW11_grades limit ?', (inserts,)).fetchall()
+    start = time.perf_counter()
+    with connection:
+        connection.executemany('insert into HW11_grades values (?, ?, ?, ?)', grades)
+    results.append({'step': f'insert {len(grades)} grades', 'seconds': time.perf_counter() - start, 'rows': len(grades), 'plan': []})
+    connection.close()
+    return results
+
+
+def bench_load_db(dir_path, db_file):
+    """ time load_database of the files in dir_path into db_file, then building the indexes and instructor counts """
+    begin = time.perf_counter()
+    rows = hw11.load_database(dir_path, db_file, build_indexes=False)
+    loaded = time.perf_counter()
+    connection = sqlite3.connect(db_file)
+    hw11.create_schema(connection)
+    connection.close()
+    indexed = time.perf_counter()
+    total = sum(rows.values())
+    return [{'step': 'load', 'seconds': loaded - begin, 'rows': total},
+            {'step': 'indexes and counts', 'seconds': indexed - loaded, 'rows': total},
+            {'step': 'total', 'seconds': indexed - begin, 'rows': total}]
+
+
+def bench_report(dir_path):
+    """ time and trace the peak memory of printing the student summary from a PrettyTable and with write_student_summary """
+    stevens = hw11.University(dir_path, pool=hw11.ConnectionPool(':memory:'))
+    results = []
+    with open(os.devnull, 'w') as fp:
+        for mode, report in (('prettytable', lambda: print(stevens.student_prettytable(), file=fp)),
+                             ('streamed', lambda: stevens.write_student_summary(fp))):
+            gc.collect()
+            tracemalloc.start()
+            begin = time.perf_counter()
+            report()
+            seconds = time.perf_counter() - begin
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results.append({'mode': mode, 'seconds': seconds, 'peak_bytes': peak})
+    return results
+
+
+def bench_export(dir_path, formats=tuple(hw11.EXPORT_FORMATS)):
+    """ time export_summary of the university in dir_path in each of formats, skipping the ones that need pyarrow without it """
+    stevens = hw11.University(dir_path, pool=hw11.ConnectionPool(':memory:'))
+    results = []
+    for file_format in formats:
+        begin = time.perf_counter()
+        try:
+            file_names = stevens.export_summary(dir_path, file_format)
+        except ImportError:
+            continue
+        seconds = time.perf_counter() - begin
+        results.append({'format': file_format, 'seconds': seconds, 'rows': len(stevens.students), 'bytes': sum(map(os.path.getsize, file_names))})
+    return results
+
+
+async def _service_client(port, requests, latencies):
+    """ send requests one at a time over one connection and note the latency of each answer """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    for request in requests:
+        begin = time.perf_counter()
+        writer.write(request)
+        await reader.readline()
+        latencies.append(time.perf_counter() - begin)
+    writer.close()
+
+
+async def _service_load(service, clients, requests):
+    server = await service.start(port=0)
+    port = server.sockets[0].getsockname()[1]
+    latencies = []
+    async with server:
+        begin = time.perf_counter()
+        await asyncio.gather(*[_service_client(port, client_requests, latencies) for client_requests in requests])
+        seconds = time.perf_counter() - begin
+    return latencies, seconds
+
+
+def bench_service(dir_path, clients=200, requests_per_client=100, instructor_share=0.1, max_pending=64, seed=810):
+    """ load the university in dir_path and its database, then have clients connections each send requests_per_client
+        student or instructor queries to a UniversityService in the same process and return the latency percentiles
+    """
+    db_file = os.path.join(dir_path, 'Homework11.db')
+    hw11.load_database(dir_path, db_file)
+    pool = hw11.ConnectionPool(db_file)
+    stevens = hw11.University(dir_path, pool=pool)
+    service = hw11.UniversityService(stevens, max_pending=max_pending)
+    rng = random.Random(seed)
+    students, instructors = list(stevens.students), list(stevens.instructors)
+    requests = [[f'instructor {rng.choice(instructors)}\n'.encode() if rng.random() < instructor_share else f'student {rng.choice(students)}\n'.encode()
+                 for _ in range(requests_per_client)] for _ in range(clients)]
+    try:
+        latencies, seconds = asyncio.run(_service_load(service, clients, requests))
+    finally:
+        service.close()
+        pool.close()
+    latencies.sort()
+    return {'requests': len(latencies), 'seconds': seconds, 'p50': latencies[len(latencies) // 2],
+            'p99': latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)], 'max': latencies[-1]}
+
+
+def bench_sharded(dir_paths, processes=None):
+    """ time ShardedUniversity over dir_paths in threads and in processes, then its merged instructor summary """
+    results = []
+    for mode, workers in (('threads', None), ('processes', processes or os.cpu_count())):
+        begin = time.perf_counter()
+        sharded = hw11.ShardedUniversity(dir_paths, processes=workers if mode == 'processes' else None)
+        loaded = time.perf_counter()
+        rows = sum(1 for row in sharded.instructor_rows())
+        results.append({'mode': mode, 'load_seconds': loaded - begin, 'instructor_seconds': time.perf_counter() - loaded, 'instructor_rows': rows})
+        del sharded
+    return results
+
+
+def bench_grades(dir_path):
+    """ time grade_stats of the university in dir_path and the per-major and per-course aggregates read from it """
+    stevens = hw11.University(dir_path, pool=hw11.ConnectionPool(':memory:'))
+    begin = time.perf_counter()
+    stats = stevens.grade_stats()
+    results = [{'step': 'grade_stats', 'seconds': time.perf_counter() - begin, 'rows': len(stats)}]
+    for step in ('by_major', 'distributions'):
+        begin = time.perf_counter()
+        rows = getattr(stats, step)()
+        results.append({'step': step, 'seconds': time.perf_counter() - begin, 'rows': len(rows)})
+    return results
+
+
+def bench_parallel(dir_path, worker_counts=(1, 2, 4, 8)):
+    """ time University(workers=n) for each n, with the part the parent spends merging the workers' results """
+    results = []
+    for workers in worker_counts:
+        instruments = hw11.Instrumentation()
+        begin = time.perf_counter()
+        stevens = hw11.University(dir_path, workers=workers, instruments=instruments)
+        seconds = time.perf_counter() - begin
+        phases = instruments.report()['phases']
+        results.append({'workers': workers, 'load_seconds': seconds, 'grades_seconds': phases['import_grades']['wall'],
+                        'merge_seconds': phases['merge grades']['cpu'] if 'merge grades' in phases else 0.0})
+        del stevens
+    return results
+
+
+def bench_watch(dir_path, students, segments=20, lines=1000, interval=hw11.WATCH_INTERVAL, seed=810):
+    """ append segments of lines new grades to grades.txt in dir_path while a LiveSummary watches it and return the
+        latency of each segment, from the end of the write to the updated rows, and the time of a full load
+    """
+    begin = time.perf_counter()
+    live = hw11.LiveSummary(hw11.University(dir_path, pool=hw11.ConnectionPool(':memory:')), interval)
+    load_seconds = time.perf_counter() - begin
+    rng = random.Random(seed)
+    instructors = list(live.university.instructors)
+    updated = queue.Queue()
+    stop = threading.Event()
+    thread = threading.Thread(target=live.watch, args=(lambda students, instructors: updated.put(time.perf_counter()), stop))
+    thread.start()
+    latencies = []
+    try:
+        for segment in range(segments):
+            with open(os.path.join(dir_path, 'grades.txt'), 'a') as fp:
+                fp.write(''.join(f"{10000 + rng.randrange(students)}\tSSW {900 + segment}\t{rng.choice(GRADES)}\t{rng.choice(instructors)}\n"
+                                 for _ in range(lines)))
+            written = time.perf_counter()
+            latencies.append(updated.get(timeout=60) - written)
+    finally:
+        stop.set()
+        thread.join()
+    latencies.sort()
+    return {'load_seconds': load_seconds, 'segments': segments, 'lines': lines, 'p50': latencies[len(latencies) // 2], 'max': latencies[-1]}
+
+
+SUITE_VERSION = 1 # change when write_university or the steps change, results of different versions don't compare
+
+
+def _best_time(function, repeat):
+    """ return the fastest of repeat runs of function and its last result """
+    best = None
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - begin
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+
+def bench_suite(scales, dir_path=None, repeat=1, max_table_students=1000000, seed=810):
+    """ for each number of students in scales write a synthetic university and its Homework11.db, then time
+        load_database, University.__init__, each *_prettytable with its rendering and the SQL instructor summary.
+        The prettytables are skipped above max_table_students students. Return the results as a JSON-ready dict
+    """
+    results = []
+    for students in scales:
+        with tempfile.TemporaryDirectory(dir=dir_path) as tmp:
+            enrollments = write_university(tmp, students, seed=seed)
+            db_file = os.path.join(tmp, 'Homework11.db')
+            steps = [('load_database', lambda: hw11.load_database(tmp, db_file))]
+            seconds, rows = _best_time(steps[0][1], repeat)
+            record = lambda step, seconds, rows: results.append({'students': students, 'enrollments': enrollments, 'step': step, 'seconds': seconds, 'rows': rows})
+            record('load_database', seconds, sum(rows.values()))
+
+            pool = hw11.ConnectionPool(db_file)
+            seconds, stevens = _best_time(lambda: hw11.University(tmp, pool=pool), repeat)
+            record('University.__init__', seconds, enrollments)
+            seconds, rows = _best_time(lambda: pool.execute(hw11.INSTRUCTOR_SUMMARY), repeat)
+            record('instructor sql', seconds, len(rows))
+            if students <= max_table_students:
+                for name in ('student_prettytable', 'instructor_prettytable', 'major_prettytable'):
+                    seconds, table = _best_time(getattr(stevens, name), repeat)
+                    record(name, seconds, len(table.rows))
+                    seconds, text = _best_time(table.get_string, repeat)
+                    record(name + ' render', seconds, len(table.rows))
+            del stevens
+            pool.close()
+    return {'version': SUITE_VERSION, 'seed': seed, 'repeat': repeat, 'python': platform.python_version(), 'machine': platform.platform(),
+            'cpus': os.cpu_count(), 'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}
+
+
+def compare_suites(old, new, threshold=1.1):
+    """ return (students, step, old seconds, new seconds, ratio, slower) for the steps in both suite results,
+        slower is True when the new time is more than threshold times the old one
+    """
+    if old.get('version') != new.get('version'):
+        raise ValueError(f"can't compare suite version {old.get('version')} with {new.get('version')}")
+    before = {(result['students'], result['step']): result['seconds'] for result in old['results']}
+    rows = []
+    for result in new['results']:
+        key = (result['students'], result['step'])
+        if key in before:
+            ratio = result['seconds'] / before[key] if before[key] else float('inf')
+            rows.append((*key, before[key], result['seconds'], ratio, ratio > threshold))
+    return rows
+
+
+def _rss():
+    """ peak resident set size of this process in bytes """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _current_rss():
+    """ current resident set size of this process in bytes """
+    with open('/proc/self/statm') as fp:
+        return int(fp.read().split()[1]) * resource.getpagesize()
+
+
+def _load_grades(reader_name, file_name, queue):
+    """ build student -> {course: grade} from file_name like University.import_grades does, report time and memory """
+    gc.disable() # University.__init__ imports with the garbage collector paused as well
+    start_rss = _current_rss()
+    start = time.perf_counter()
+    courses = dict()
+    rows = 0
+    if reader_name == 'file_reader':
+        for student_cwid, course, grade, instructor_cwid in hw11.file_reader(file_name, 4, '\t'):
+            courses.setdefault(student_cwid, dict())[course] = grade
+            rows += 1
+    else:
+        reader = getattr(hw11, reader_name)
+        for batch in reader(file_name, 4, '\t', shared=(1, 2, 3)):
+            for student_cwid, course, grade, instructor_cwid in batch:
+                courses.setdefault(student_cwid, dict())[course] = grade
+            rows += len(batch)
+    seconds = time.perf_counter() - start
+    queue.put({'reader': reader_name, 'rows': rows, 'seconds': seconds,
+               'final_bytes': _current_rss() - start_rss, 'peak_bytes': _rss() - start_rss})
+
+
+def bench_readers(file_name):
+    """ run each reader in a fresh process so that peak memory is measured separately for each """
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for reader_name in ('file_reader', 'file_reader_batches', 'mmap_file_reader'):
+        queue = context.Queue()
+        process = context.Process(target=_load_grades, args=(reader_name, file_name, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    readers = commands.add_parser('readers', help='compare the file readers on a synthetic grades file')
+    readers.add_argument('--size', default='5G', help='size of the synthetic grades file (default 5G)')
+    readers.add_argument('--dir', default=None, help='where to write the synthetic file (default a temporary directory)')
+    memory = commands.add_parser('memory', help='compare the memory used by the default and compact storage modes')
+    memory.add_argument('--students', type=int, default=100000, help='number of synthetic students (default 100000)')
+    snapshot = commands.add_parser('snapshot', help='time a cold start that parses the files against a warm start from the snapshot')
+    snapshot.add_argument('--students', type=int, default=100000, help='number of synthetic students (default 100000)')
+    snapshot.add_argument('--compact', action='store_true', help='use the compact storage mode')
+    instructor_sql = commands.add_parser('instructor-sql', help='time the instructor summary query with and without indexes')
+    instructor_sql.add_argument('--rows', default='10M', help='number of grade rows (default 10M)')
+    load_db = commands.add_parser('load-db', help='time load_database on synthetic files')
+    load_db.add_argument('--students', type=int, default=5000000, help='number of synthetic students, 10 grades each (default 5000000)')
+    load_db.add_argument('--dir', default=None, help='where to write the files and database (default a temporary directory)')
+    report = commands.add_parser('report', help='compare the student summary as a PrettyTable with the streamed one')
+    report.add_argument('--students', type=int, default=100000, help='number of synthetic students (default 100000)')
+    export = commands.add_parser('export', help='time the columnar export of the summaries')
+    export.add_argument('--students', type=int, default=1000000, help='number of synthetic students (default 1000000)')
+    service = commands.add_parser('service', help='load test the asyncio query service')
+    service.add_argument('--students', type=int, default=100000, help='number of synthetic students (default 100000)')
+    service.add_argument('--clients', type=int, default=200, help='number of concurrent connections (default 200)')
+    service.add_argument('--requests', type=int, default=100, help='requests sent by each client (default 100)')
+    service.add_argument('--max-pending', type=int, default=64, help='queries the service answers at a time (default 64)')
+    sharded = commands.add_parser('sharded', help='time a university split over several directories')
+    sharded.add_argument('--shards', type=int, default=4, help='number of directories (default 4)')
+    sharded.add_argument('--students', type=int, default=100000, help='synthetic students per directory (default 100000)')
+    sharded.add_argument('--processes', type=int, default=None, help='worker processes (default the number of CPUs)')
+    watch = commands.add_parser('watch', help='time how long appended grades take to show up in a LiveSummary')
+    watch.add_argument('--students', type=int, default=1000000, help='number of synthetic students (default 1000000)')
+    watch.add_argument('--segments', type=int, default=20, help='number of appends (default 20)')
+    watch.add_argument('--lines', type=int, default=1000, help='grades per append (default 1000)')
+    symbols = commands.add_parser('symbols', help='compare the memory of a University with and without the shared symbol table')
+    symbols.add_argument('--students', type=int, default=100000, help='number of synthetic students (default 100000)')
+    grades = commands.add_parser('grades', help='time the GPA and pass/fail columns and the aggregates over them')
+    grades.add_argument('--students', type=int, default=1000000, help='number of synthetic students (default 1000000)')
+    parallel = commands.add_parser('parallel', help='time importing the grades with several numbers of worker processes')
+    parallel.add_argument('--students', type=int, default=100000, help='number of synthetic students (default 100000)')
+    parallel.add_argument('--workers', default='1,2,4,8', help='comma separated numbers of worker processes (default 1,2,4,8)')
+    suite = commands.add_parser('suite', help='time loading and the summaries at several scales and save the results as JSON')
+    suite.add_argument('--scales', default='1K,10K,100K', help='comma separated numbers of students, up to 10M (default 1K,10K,100K)')
+    suite.add_argument('--out', default=None, help='JSON file to write the results to')
+    suite.add_argument('--compare', default=None, help='JSON file of an earlier run to compare with')
+    suite.add_argument('--repeat', type=int, default=1, help='runs of each step, the fastest counts (default 1)')
+    suite.add_argument('--max-table-students', type=int, default=1000000, help='skip the prettytables above this many students (default 1000000)')
+    suite.add_argument('--seed', type=int, default=810, help='seed of the synthetic data (default 810)')
+    suite.add_argument('--dir', default=None, help='where to write the synthetic files (default a temporary directory)')
+    args = parser.parse_args()
+
+    if args.command == 'readers':
+        with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+            grades_file = os.path.join(tmp, 'grades.txt')
+            lines = write_grades(grades_file, parse_size(args.size))
+            print(f"{grades_file}: {os.path.getsize(grades_file) / (1 << 20):.0f} MB, {lines} lines")
+            for result in bench_readers(grades_file):
+                print(f"{result['reader']:20} {result['seconds']:8.2f} s {result['rows'] / result['seconds']:12.0f} rows/s "
+                      f"final {result['final_bytes'] / (1 << 20):8.1f} MB  peak {result['peak_bytes'] / (1 << 20):8.1f} MB")
+
+    elif args.command == 'memory':
+        with tempfile.TemporaryDirectory() as tmp:
+            enrollments = write_university(tmp, args.students)
+            print(f"{args.students} students, {enrollments} enrollments")
+            for result in bench_memory(tmp, enrollments):
+                print(f"{result['mode']:10} {result['bytes'] / (1 << 20):8.1f} MB {result['bytes_per_enrollment']:8.1f} bytes per enrollment")
+
+    elif args.command == 'snapshot':
+        with tempfile.TemporaryDirectory() as tmp:
+            enrollments = write_university(tmp, args.students)
+            print(f"{args.students} students, {enrollments} enrollments")
+            for result in bench_snapshot(tmp, args.compact):
+                if 'seconds' in result:
+                    print(f"{result['start']:14} {result['seconds']:8.2f} s")
+                else:
+                    print(f"{result['start']:14} {result['bytes'] / (1 << 20):8.1f} MB")
+
+    elif args.command == 'instructor-sql':
+        with tempfile.TemporaryDirectory() as tmp:
+            db_file = os.path.join(tmp, 'Homework11.db')
+            write_grades_db(db_file, parse_count(args.rows))
+            for result in bench_instructor_sql(db_file):
+                print(f"{result['step']:26} {result['seconds']:8.2f} s {result['rows']:8} rows  {'; '.join(result['plan'])}")
+
+    elif args.command == 'load-db':
+        with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+            enrollments = write_university(tmp, args.students)
+            print(f"{args.students} students, {enrollments} enrollments")
+            for result in bench_load_db(tmp, os.path.join(tmp, 'Homework11.db')):
+                print(f"{result['step']:20} {result['seconds']:8.2f} s {result['rows'] / result['seconds']:12.0f} rows/s")
+
+    elif args.command == 'report':
+        with tempfile.TemporaryDirectory() as tmp:
+            write_university(tmp, args.students)
+            print(f"{args.students} students")
+            for result in bench_report(tmp):
+                print(f"{result['mode']:12} {result['seconds']:8.2f} s  peak {result['peak_bytes'] / (1 << 20):8.1f} MB")
+
+    elif args.command == 'export':
+        with tempfile.TemporaryDirectory() as tmp:
+            write_university(tmp, args.students)
+            print(f"{args.students} students")
+            for result in bench_export(tmp):
+                print(f"{result['format']:8} {result['seconds']:8.2f} s {result['rows'] / result['seconds']:12.0f} students/s {result['bytes'] / (1 << 20):8.1f} MB")
+
+    elif args.command == 'service':
+        with tempfile.TemporaryDirectory() as tmp:
+            write_university(tmp, args.students)
+            result = bench_service(tmp, args.clients, args.requests, max_pending=args.max_pending)
+            print(f"{args.students} students, {args.clients} clients: {result['requests']} requests in {result['seconds']:.2f} s "
+                  f"({result['requests'] / result['seconds']:.0f}/s)  p50 {result['p50'] * 1000:.2f} ms  p99 {result['p99'] * 1000:.2f} ms  max {result['max'] * 1000:.2f} ms")
+
+    elif args.command == 'sharded':
+        with tempfile.TemporaryDirectory() as tmp:
+            dir_paths = []
+            for shard in range(args.shards):
+                dir_paths.append(os.path.join(tmp, f"shard{shard}"))
+                os.mkdir(dir_paths[-1])
+                write_university(dir_paths[-1], args.students, seed=810 + shard)
+            print(f"{args.shards} directories of {args.students} students, {os.cpu_count()} CPUs")
+            for result in bench_sharded(dir_paths, args.processes):
+                print(f"{result['mode']:10} load {result['load_seconds']:8.2f} s  merged instructor summary {result['instructor_seconds']:6.2f} s {result['instructor_rows']} rows")
+
+    elif args.command == 'watch':
+        with tempfile.TemporaryDirectory() as tmp:
+            write_university(tmp, args.students)
+            result = bench_watch(tmp, args.students, args.segments, args.lines)
+            print(f"{args.students} students, full load {result['load_seconds']:.2f} s, {result['segments']} appends of {result['lines']} grades: "
+                  f"latency p50 {result['p50'] * 1000:.0f} ms  max {result['max'] * 1000:.0f} ms")
+
+    elif args.command == 'symbols':
+        with tempfile.TemporaryDirectory() as tmp:
+            enrollments = write_university(tmp, args.students)
+            print(f"{args.students} students, {enrollments} enrollments")
+            for result in bench_symbols(tmp, args.students):
+                print(f"{result['mode']:10} {result['bytes'] / (1 << 20):8.1f} MB {result['bytes_per_student']:8.0f} bytes/student  {result['symbols']} symbols")
+
+    elif args.command == 'grades':
+        with tempfile.TemporaryDirectory() as tmp:
+            write_university(tmp, args.students)
+            print(f"{args.students} students")
+            for result in bench_grades(tmp):
+                print(f"{result['step']:14} {result['seconds']:8.3f} s {result['rows']:>10} rows")
+
+    elif args.command == 'parallel':
+        with tempfile.TemporaryDirectory() as tmp:
+            write_university(tmp, args.students)
+            print(f"{args.students} students, {os.cpu_count()} CPUs")
+            for result in bench_parallel(tmp, [int(workers) for workers in args.workers.split(',')]):
+                print(f"{result['workers']:3} workers  load {result['load_seconds']:8.2f} s  grades {result['grades_seconds']:8.2f} s  merge {result['merge_seconds']:8.2f} s")
+
+    elif args.command == 'suite':
+        suite = bench_suite([parse_count(scale) for scale in args.scales.split(',')], args.dir, args.repeat, args.max_table_students, args.seed)
+        for result in suite['results']:
+            print(f"{result['students']:>10} {result['step']:32} {result['seconds']:10.3f} s {result['rows']:>12} rows")
+        if args.out:
+            with open(args.out, 'w') as fp:
+                json.dump(suite, fp, indent=2)
+        if args.compare:
+            with open(args.compare) as fp:
+                old = json.load(fp)
+            print(f"compared with {args.compare} ({old['created']})")
+            for students, step, before, after, ratio, slower in compare_suites(old, suite):
+                print(f"{students:>10} {step:32} {before:10.3f} s {after:10.3f} s {ratio:6.2f}x{'  SLOWER' if slower else ''}")
+
+
+if __name__ == '__main__':
+    main()